@@ -2,6 +2,8 @@
 ASGI config for workflow project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The real-time task events stream (/api/tasks/events/) is served through this
+entry point, see tasks/realtime.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -11,6 +13,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'workflow.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 import environ
+from botocore.config import Config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -131,6 +132,16 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing, changing the iteration count rehashes passwords on login
+PASSWORD_HASH_ITERATIONS = env.int('PASSWORD_HASH_ITERATIONS', 1000000)
+PASSWORD_HASHERS = [
+    'tasks.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -152,6 +163,9 @@ STATIC_ROOT = '/app/static'
 MEDIA_URL = '/media/' if DEBUG else f'https://{env.str("HETZNER_BUCKET_NAME")}.{env.str("HETZNER_ENDPOINT_URL").split("://")[1]}/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Number of files written to storage in parallel per web worker process
+DOCUMENT_UPLOAD_WORKERS = env.int('DOCUMENT_UPLOAD_WORKERS', 8)
+
 # Storage configuration
 if DEBUG:
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
@@ -166,19 +180,58 @@ else:
                 "bucket_name": env.str('HETZNER_BUCKET_NAME'),
                 "endpoint_url": env.str('HETZNER_ENDPOINT_URL'),
                 "region_name": "eu-central-1",
-                "default_acl": "public-read",
-                "querystring_auth": False,
+                # Documents are private, API URLs are signed and downloads go through
+                # /api/documents/{id}/download/
+                "default_acl": env.str('MEDIA_DEFAULT_ACL', 'private'),
+                "querystring_auth": env.bool('MEDIA_QUERYSTRING_AUTH', True),
+                "querystring_expire": env.int('MEDIA_QUERYSTRING_EXPIRE', 3600),
                 "file_overwrite": False,
                 "verify": True,
                 "use_ssl": True,
                 "addressing_style": "path",
-                "signature_version": "s3"
+                "signature_version": "s3",
+                # Keep enough pooled connections for the parallel document uploads
+                "client_config": Config(
+                    s3={"addressing_style": "path"},
+                    signature_version="s3",
+                    max_pool_connections=DOCUMENT_UPLOAD_WORKERS * 2,
+                ),
             },
         },
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
         },
     }
+# Protected document downloads
+# 'redirect': presigned S3 URL, 'accel': nginx X-Accel-Redirect, 'direct': served by Django (development)
+DOCUMENT_DOWNLOAD_MODE = env.str('DOCUMENT_DOWNLOAD_MODE', 'direct' if DEBUG else 'redirect')
+DOCUMENT_DOWNLOAD_EXPIRES = 60  # Presigned download URLs are valid for 1 minute
+
+# Direct (presigned) uploads to object storage
+DIRECT_UPLOAD_EXPIRES = 900  # Presigned URLs are valid for 15 minutes
+DIRECT_UPLOAD_MAX_FILES = 50
+
+# Resumable (chunked) uploads
+RESUMABLE_UPLOAD_MIN_CHUNK_SIZE = 5242880  # 5MB, minimum S3 multipart part size
+RESUMABLE_UPLOAD_MAX_CHUNK_SIZE = 33554432  # 32MB
+
+# Background jobs (thumbnails etc.) run in the web process
+BACKGROUND_TASKS_EAGER = False  # Run jobs inline, used in tests
+BACKGROUND_TASK_WORKERS = 2
+IMAGE_PROCESSING_WORKERS = 2
+
+# Document thumbnails
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_FORMAT = 'WEBP'  # WEBP or JPEG
+THUMBNAIL_QUALITY = 80
+
+# Uploaded photo normalization (downscale, EXIF orientation, metadata stripping)
+PHOTO_NORMALIZATION_ENABLED = env.bool('PHOTO_NORMALIZATION_ENABLED', True)
+PHOTO_MAX_DIMENSION = 2560  # Longest side in pixels
+PHOTO_MAX_BYTES = 2097152  # Photos above 2MB are re-encoded
+PHOTO_QUALITY = 82
+PHOTO_KEEP_ORIGINAL = env.bool('PHOTO_KEEP_ORIGINAL', False)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -189,13 +242,37 @@ AUTH_USER_MODEL = 'tasks.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'tasks.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10  # Show 10 documents per page
 }
 
+# Cache (users resolved from JWTs etc.). Invalidation only reaches other processes through a shared
+# cache, the compose files set CACHE_URL to Redis; the local memory default is for tests and manage.py
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+JWT_USER_CACHE_TIMEOUT = 60  # Bounds staleness if a process runs without the shared cache
+ROUTE_CACHE_TIMEOUT = 60 * 10  # Routes are also dropped when assignments or tasks change (shared cache)
+ROUTE_TIME_BUDGET = 0.2  # Seconds spent improving a route with 2-opt
+
+# Geocoding of task addresses, disabled unless a provider is configured (addresses are sent to it)
+# tasks.geocoding.NominatimGeocoder or tasks.geocoding.FixtureGeocoder (offline, GEOCODING_FIXTURE)
+GEOCODING_PROVIDER = env.str('GEOCODING_PROVIDER', '')
+GEOCODING_URL = env.str('GEOCODING_URL', 'https://nominatim.openstreetmap.org/search')
+GEOCODING_USER_AGENT = env.str('GEOCODING_USER_AGENT', 'WorkFlow')
+GEOCODING_FIXTURE = env.str('GEOCODING_FIXTURE', '')  # JSON file of address -> [latitude, longitude]
+GEOCODING_TIMEOUT = 10
+GEOCODING_MIN_INTERVAL = 1.0  # Seconds between provider requests of one process
+
+# Worker location check-ins (maintain_location_partitions runs daily)
+LOCATION_BATCH_MAX_POINTS = 500  # Points per check-in request
+LOCATION_MAX_AGE_HOURS = 24  # Older points (offline backlogs) are rejected
+LOCATION_RETENTION_DAYS = env.int('LOCATION_RETENTION_DAYS', 30)
+LOCATION_PARTITION_DAYS_AHEAD = 7
+
 # JWT Settings
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -209,6 +286,12 @@ SIMPLE_JWT = {
 }
 
 
+# Real-time task events
+# InProcessBroker only reaches subscribers in the same process (tests, single node).
+# Use tasks.realtime.PostgresBroker when web workers and the ASGI events server are separate.
+REALTIME_BACKEND = env.str('REALTIME_BACKEND', 'tasks.realtime.InProcessBroker')
+REALTIME_KEEPALIVE_SECONDS = 15
+
 CORS_ALLOW_CREDENTIALS = True  # Allow sending cookies and Authorization headers
 CORS_ALLOW_ALL_ORIGINS = True if DEBUG else False  # Allow all origins only in development environment
 
@@ -230,7 +313,16 @@ CORS_ALLOW_METHODS = [
 ]
 
 # Email settings
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Emails are queued and sent by the mail worker (python manage.py send_queued_mail --loop)
+EMAIL_BACKEND = 'notifications.mail.QueuedEmailBackend'
+EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_QUEUE_BATCH_SIZE = 50  # Messages sent over one SMTP connection
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_CLAIM_TIMEOUT = 60 * 30  # Messages claimed by a worker that died are sent again after this
+EMAIL_TIMEOUT = 30
+
+INVITATION_BULK_MAX_EMAILS = 500  # Emails per bulk invitation request
+INVITATION_RETENTION_DAYS = 30  # Unused codes are deleted this long after expiry (sweep_invitations)
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -242,5 +334,8 @@ if not CSRF_TRUSTED_ORIGINS:  # If environment variable is empty, use default va
     CSRF_TRUSTED_ORIGINS = ['http://localhost:8000', 'http://127.0.0.1:8000']
 
 # File upload limits
-DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# Uploaded files are not counted here, only form fields and JSON bodies
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+# Larger files are spooled to disk while they are hashed (tasks/uploads.py)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+FILE_UPLOAD_HANDLERS = ['tasks.uploads.HashingUploadHandler']
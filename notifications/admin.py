@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import DeviceToken
+from django.utils import timezone
+from .models import DeviceToken, QueuedEmail
 
 @admin.register(DeviceToken)
 class DeviceTokenAdmin(admin.ModelAdmin):
@@ -9,3 +10,18 @@ class DeviceTokenAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     raw_id_fields = ('user',)
     date_hierarchy = 'created_at'
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'to')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    date_hierarchy = 'created_at'
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='queued', next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} emails queued again.")
+    retry_now.short_description = 'Retry now'
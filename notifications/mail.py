@@ -0,0 +1,127 @@
+"""
+Queued email delivery.
+
+QueuedEmailBackend (EMAIL_BACKEND) only stores messages, so views never wait
+for an SMTP handshake. The send_queued_mail worker delivers them in batches
+over one connection of EMAIL_DELIVERY_BACKEND and retries failed messages
+with exponential backoff. Messages are claimed (status sending) before the
+connection is opened, so no row lock is held while talking to the server.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+
+def get_delivery_connection(**kwargs):
+    return get_connection(
+        getattr(settings, 'EMAIL_DELIVERY_BACKEND', 'django.core.mail.backends.smtp.EmailBackend'),
+        **kwargs
+    )
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Stores outgoing messages in QueuedEmail instead of sending them"""
+
+    def send_messages(self, email_messages):
+        queued = []
+        for message in email_messages:
+            if message.attachments:
+                # Attachments are not stored, these messages are sent right away
+                get_delivery_connection(fail_silently=self.fail_silently).send_messages([message])
+                continue
+            queued.append(QueuedEmail.from_message(message))
+        QueuedEmail.objects.bulk_create(queued)
+        return len(email_messages)
+
+
+def retry_delay(attempts):
+    """1, 2, 4, 8... minutes, at most one hour"""
+    return timedelta(minutes=min(2 ** (attempts - 1), 60))
+
+
+def _open_connection():
+    connection = get_delivery_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Email connection could not be opened: {e}")
+        return None
+    return connection
+
+
+def claim_due_emails(batch_size):
+    """
+    Marks a batch of due messages as sending in a short transaction and returns them.
+    Rows are locked with SKIP LOCKED only while claiming, so several workers can run.
+    Claims of a worker that died are taken over after EMAIL_QUEUE_CLAIM_TIMEOUT.
+    """
+    now = timezone.now()
+    claim_timeout = timedelta(seconds=getattr(settings, 'EMAIL_QUEUE_CLAIM_TIMEOUT', 30 * 60))
+    with transaction.atomic():
+        emails = list(
+            QueuedEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['queued', 'sending'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for email in emails:
+            email.status = 'sending'
+            email.attempts += 1
+            email.next_attempt_at = now + claim_timeout
+        QueuedEmail.objects.bulk_update(emails, ['status', 'attempts', 'next_attempt_at'])
+    return emails
+
+
+def send_queued_mail(batch_size=None):
+    """
+    Sends due messages over one connection, returns (sent, failed).
+    Messages are claimed first, the SMTP conversation runs outside any transaction.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+
+    emails = claim_due_emails(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = _open_connection()
+
+    now = timezone.now()
+    for email in emails:
+        try:
+            if connection is None:
+                raise ConnectionError('Email connection could not be opened')
+            connection.send_messages([email.to_message()])
+        except Exception as e:
+            failed += 1
+            if connection is not None:
+                # The connection may be broken, the next message gets a new one
+                connection.close()
+                connection = _open_connection()
+            email.last_error = str(e)
+            if email.attempts >= max_attempts:
+                email.status = 'failed'
+                logger.error(f"Email to {', '.join(email.to)} failed after {email.attempts} attempts: {e}")
+            else:
+                email.status = 'queued'
+                email.next_attempt_at = now + retry_delay(email.attempts)
+            continue
+        sent += 1
+        email.status = 'sent'
+        email.sent_at = timezone.now()
+        email.last_error = ''
+
+    if connection is not None:
+        connection.close()
+
+    QueuedEmail.objects.bulk_update(emails, ['status', 'last_error', 'next_attempt_at', 'sent_at'])
+    return sent, failed
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Sends queued emails in batches over one connection, failed messages are retried'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages sent per connection')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new messages')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            # Send batches until the queue has no due messages
+            while True:
+                sent, failed = send_queued_mail(options['batch_size'])
+                if sent or failed:
+                    self.stdout.write(f"Emails sent: {sent}, failed: {failed}")
+                if not sent and not failed:
+                    break
+
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
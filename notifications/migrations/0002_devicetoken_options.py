@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='devicetoken',
+            options={'ordering': ['-created_at'], 'verbose_name': 'Device Token', 'verbose_name_plural': 'Device Tokens'},
+        ),
+        migrations.AlterField(
+            model_name='devicetoken',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Created At'),
+        ),
+        migrations.AlterField(
+            model_name='devicetoken',
+            name='device_type',
+            field=models.CharField(choices=[('android', 'Android'), ('ios', 'iOS'), ('web', 'Web')], default='android', max_length=20, verbose_name='Device Type'),
+        ),
+        migrations.AlterField(
+            model_name='devicetoken',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Is Active'),
+        ),
+        migrations.AlterField(
+            model_name='devicetoken',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Updated At'),
+        ),
+        migrations.AlterField(
+            model_name='devicetoken',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_tokens', to=settings.AUTH_USER_MODEL, verbose_name='User'),
+        ),
+    ]
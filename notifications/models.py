@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 
 # Create your models here.
 
@@ -49,3 +51,79 @@ class DeviceToken(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.device_type}"
+
+
+class QueuedEmail(models.Model):
+    """
+    Outgoing email stored by QueuedEmailBackend.
+    Messages are delivered by the send_queued_mail worker, failed sends are retried.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=998, verbose_name='Subject')
+    body = models.TextField(blank=True, verbose_name='Body')
+    from_email = models.CharField(max_length=254, blank=True, verbose_name='From')
+    to = models.JSONField(default=list, verbose_name='To')
+    cc = models.JSONField(default=list, blank=True, verbose_name='Cc')
+    bcc = models.JSONField(default=list, blank=True, verbose_name='Bcc')
+    reply_to = models.JSONField(default=list, blank=True, verbose_name='Reply To')
+    headers = models.JSONField(default=dict, blank=True, verbose_name='Headers')
+    # [content, mimetype] pairs, e.g. the HTML version
+    alternatives = models.JSONField(default=list, blank=True, verbose_name='Alternatives')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name='Status'
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Attempts')
+    last_error = models.TextField(blank=True, verbose_name='Last Error')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Next Attempt At')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Created At')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Sent At')
+
+    class Meta:
+        verbose_name = 'Queued Email'
+        verbose_name_plural = 'Queued Emails'
+        ordering = ['-created_at']
+        indexes = [
+            # The worker only reads due messages
+            models.Index(fields=['status', 'next_attempt_at'], name='queuedemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{', '.join(self.to)} - {self.subject}"
+
+    @classmethod
+    def from_message(cls, message):
+        alternatives = [[content, mimetype] for content, mimetype in getattr(message, 'alternatives', [])]
+        return cls(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email or '',
+            to=list(message.to),
+            cc=list(message.cc),
+            bcc=list(message.bcc),
+            reply_to=list(message.reply_to),
+            headers=dict(message.extra_headers),
+            alternatives=alternatives
+        )
+
+    def to_message(self, connection=None):
+        return EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email or None,
+            to=self.to,
+            cc=self.cc,
+            bcc=self.bcc,
+            reply_to=self.reply_to,
+            headers=self.headers,
+            alternatives=[tuple(alternative) for alternative in self.alternatives],
+            connection=connection
+        )
@@ -1,3 +1,83 @@
-from django.test import TestCase
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from unittest.mock import patch
 
-# Create your tests here.
+from .mail import send_queued_mail
+from .models import QueuedEmail
+
+
+@override_settings(
+    EMAIL_BACKEND='notifications.mail.QueuedEmailBackend',
+    EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class QueuedEmailTest(TestCase):
+    """Tests queued email delivery"""
+
+    def _send(self, count=1):
+        for index in range(count):
+            message = mail.EmailMultiAlternatives(
+                subject=f'Invitation {index}', body='Your code', from_email='noreply@example.com',
+                to=[f'worker{index}@example.com']
+            )
+            message.attach_alternative('<p>Your code</p>', 'text/html')
+            message.send()
+
+    def test_messages_are_queued_and_sent_in_batches(self):
+        """Sending only stores the message, the worker delivers it with the HTML version"""
+        self._send(3)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedEmail.objects.filter(status='queued').count(), 3)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as mock_open:
+            self.assertEqual(send_queued_mail(batch_size=2), (2, 0))
+        mock_open.assert_called_once()
+        self.assertEqual(send_queued_mail(batch_size=2), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(QueuedEmail.objects.exclude(status='sent').exists())
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=2)
+    def test_failed_messages_are_retried(self):
+        """Failures are retried later and given up after the maximum attempts"""
+        self._send()
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP down')):
+            self.assertEqual(send_queued_mail(), (0, 1))
+            email = QueuedEmail.objects.get()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('queued', 1, 'SMTP down'))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+            # Not due yet
+            self.assertEqual(send_queued_mail(), (0, 0))
+
+            QueuedEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(send_queued_mail(), (0, 1))
+
+        self.assertEqual(QueuedEmail.objects.get().status, 'failed')
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_messages_are_claimed_before_sending(self):
+        """Rows are marked sending before the connection is used, stale claims are taken over"""
+        self._send(2)
+        statuses = []
+
+        def record_statuses(messages):
+            statuses.append(sorted(QueuedEmail.objects.values_list('status', flat=True)))
+            return len(messages)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=record_statuses):
+            self.assertEqual(send_queued_mail(batch_size=1), (1, 0))
+        self.assertEqual(statuses, [['queued', 'sending']])
+
+        # A worker died after claiming the other message
+        email = QueuedEmail.objects.get(status='queued')
+        QueuedEmail.objects.filter(pk=email.pk).update(
+            status='sending', attempts=1, next_attempt_at=timezone.now() + timezone.timedelta(minutes=5)
+        )
+        self.assertEqual(send_queued_mail(), (0, 0))
+        QueuedEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_mail(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 2))
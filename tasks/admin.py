@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.template.defaultfilters import filesizeformat
 from django.utils.html import format_html
-from .models import User, Task, TaskDocument
+from .models import User, Task, TaskDocument, GeocodeCache, WorkerLocation
+from .documents import batched_document_deletion, DOCUMENT_COUNT_FIELDS
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -41,6 +43,7 @@ class TaskAdmin(admin.ModelAdmin):
     list_filter = ('status', 'created_at', 'due_date')
     search_fields = ('title', 'description')
     filter_horizontal = ('assigned_workers',)
+    readonly_fields = ('starting_document_count', 'ending_document_count')
     inlines = [TaskDocumentInline]
 
     def save_formset(self, request, form, formset, change):
@@ -54,38 +57,47 @@ class TaskAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not change:  # If creating new
             obj.created_by = request.user
+        else:
+            # Document counters are only written with F() updates, the loaded ones may be stale
+            obj.refresh_from_db(fields=DOCUMENT_COUNT_FIELDS.values())
         super().save_model(request, obj, form, change)
 
+    def delete_model(self, request, obj):
+        # Cascaded documents release their files together
+        with batched_document_deletion():
+            obj.delete()
+
+    def delete_queryset(self, request, queryset):
+        with batched_document_deletion():
+            queryset.delete()
+
     def document_count(self, obj):
-        starting = obj.documents.filter(document_type='beginning').count()
-        ending = obj.documents.filter(document_type='ending').count()
+        # Counters stored on the task, no queries per row
         return format_html(
             '<span style="color: green;">Starting: {}</span><br>'
             '<span style="color: red;">Ending: {}</span>',
-            starting, ending
+            obj.starting_document_count, obj.ending_document_count
         )
     document_count.short_description = 'Documents'
 
 @admin.register(TaskDocument)
 class TaskDocumentAdmin(admin.ModelAdmin):
-    list_display = ('task', 'document_type', 'uploaded_by', 'uploaded_at', 'file_preview')
-    list_filter = ('document_type', 'uploaded_at')
-    search_fields = ('task__title',)
-    readonly_fields = ('uploaded_at',)
+    list_display = ('task', 'document_type', 'uploaded_by', 'uploaded_at', 'file_preview', 'file_size',
+                    'content_type', 'bytes_saved')
+    list_filter = ('document_type', 'content_type', 'uploaded_at')
+    search_fields = ('task__title', 'checksum')
+    readonly_fields = ('uploaded_at', 'bytes_saved', 'processed_at', 'size', 'content_type', 'width', 'height',
+                       'checksum')
 
     def save_model(self, request, obj, form, change):
         if not obj.uploaded_by:
             obj.uploaded_by = request.user
         super().save_model(request, obj, form, change)
 
-    def delete_model(self, request, obj):
-        # TaskDocument model's own delete method is called manually
-        obj.delete()
-
     def delete_queryset(self, request, queryset):
-        # In bulk delete operations, each document's delete method is called
-        for obj in queryset:
-            obj.delete()
+        # One SQL delete, files are released together and removed in batches after commit
+        with batched_document_deletion():
+            queryset.delete()
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
@@ -97,7 +109,33 @@ class TaskDocumentAdmin(admin.ModelAdmin):
         formset.save_m2m()
 
     def file_preview(self, obj):
-        if obj.file and obj.file.url.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-            return format_html('<img src="{}" style="max-height: 50px;"/>', obj.file.url)
+        # Only the small thumbnail is loaded, never the full resolution original
+        if obj.thumbnail:
+            return format_html(
+                '<a href="{}"><img src="{}" style="max-height: 50px;"/></a>',
+                obj.file.url, obj.thumbnail.url
+            )
         return format_html('<a href="{}">View File</a>', obj.file.url)
     file_preview.short_description = 'Preview'
+
+    def file_size(self, obj):
+        # Stored at upload time, the storage is not asked for every row
+        if obj.size is None:
+            return '-'
+        return filesizeformat(obj.size)
+    file_size.short_description = 'Size'
+    file_size.admin_order_field = 'size'
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ('address', 'latitude', 'longitude', 'provider', 'created_at')
+    list_filter = ('provider',)
+    search_fields = ('address',)
+    readonly_fields = ('created_at',)
+
+@admin.register(WorkerLocation)
+class WorkerLocationAdmin(admin.ModelAdmin):
+    list_display = ('worker', 'latitude', 'longitude', 'accuracy', 'recorded_at')
+    list_select_related = ('worker',)
+    search_fields = ('worker__email', 'worker__first_name', 'worker__last_name')
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,89 @@
+"""
+Streaming ZIP archives of task documents.
+
+The archive is built on the fly while it is sent: every write of the
+zipfile module is yielded immediately, so memory use does not depend on
+the archive size and nothing is written to disk.
+
+Under ASGI a synchronous iterator would be collected into a list before
+the first byte is sent, so that server gets the async wrapper
+(astream_archive), which resumes the generator chunk by chunk.
+"""
+import os
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .storage import iter_object_chunks
+
+ARCHIVE_FOLDERS = {
+    'beginning': 'starting',
+    'ending': 'ending',
+}
+
+
+class _StreamBuffer:
+    """Write-only, non-seekable file object collecting zip output between yields"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Yields the collected output (if any) and empties the buffer"""
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks = []
+            yield data
+
+
+def archive_name(document):
+    """Path of a document inside the archive: starting/12.jpg"""
+    folder = ARCHIVE_FOLDERS.get(document.document_type, document.document_type)
+    extension = os.path.splitext(document.file.name)[1].lower()
+    return f"{folder}/{document.id}{extension}"
+
+
+def stream_archive(documents, chunk_size=1048576):
+    """Generator yielding a ZIP archive of the documents"""
+    buffer = _StreamBuffer()
+    # Photos and videos are already compressed, storing them is much cheaper
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for document in documents:
+            info = zipfile.ZipInfo(
+                archive_name(document),
+                date_time=timezone.localtime(document.uploaded_at).timetuple()[:6]
+            )
+            # Sizes are unknown upfront, zip64 headers keep files above 4GB valid
+            with archive.open(info, mode='w', force_zip64=True) as target:
+                for chunk in iter_object_chunks(document.file.name, chunk_size, document.file.storage):
+                    target.write(chunk)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    yield from buffer.drain()
+
+
+async def astream_archive(documents, chunk_size=1048576):
+    """Async generator over stream_archive for ASGI servers, database and storage reads stay in the sync thread"""
+    archive = stream_archive(documents, chunk_size)
+    next_chunk = sync_to_async(next)
+    try:
+        while True:
+            chunk = await next_chunk(archive, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(archive.close)()
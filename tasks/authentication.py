@@ -0,0 +1,77 @@
+"""
+JWT authentication without a users table query per request.
+
+Tokens carry the user's role and token version. The fields requests need
+(CACHED_USER_FIELDS, never the password hash) are cached for
+JWT_USER_CACHE_TIMEOUT seconds under the user's id and token version, and
+the entry is dropped whenever the user is saved or deleted. The cache must
+be shared by all web processes (CACHE_URL) for that to reach them.
+Incrementing the token version (password reset) revokes every token issued before.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+TOKEN_VERSION_CLAIM = 'ver'
+ROLE_CLAIM = 'role'
+# Other fields are loaded from the database when a request reads them
+CACHED_USER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'phone', 'role',
+    'is_active', 'is_staff', 'is_superuser', 'token_version'
+)
+
+
+def user_cache_key(user_id, version):
+    return f'jwt_user:{user_id}:{version}'
+
+
+def add_user_claims(token, user):
+    """Adds the claims read by CachedJWTAuthentication (and clients) to a token"""
+    token[ROLE_CLAIM] = user.role
+    token[TOKEN_VERSION_CLAIM] = user.token_version
+    return token
+
+
+def invalidate_cached_user(user):
+    # The previous version is dropped too, in case the version was just incremented
+    versions = range(max(user.token_version - 1, 0), user.token_version + 1)
+    cache.delete_many([user_cache_key(user.pk, version) for version in versions])
+
+
+def _cached_user(values):
+    """User instance from cached field values, from_db expects them in model field order"""
+    model = get_user_model()
+    fields = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, fields, [values[field] for field in fields])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves the user from the cache, the database is only read on a miss"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        key = user_cache_key(user_id, version)
+        values = cache.get(key)
+        if values is None:
+            # Raises for unknown and inactive users
+            user = super().get_user(validated_token)
+            values = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+            cache.set(key, values, getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60))
+        else:
+            user = _cached_user(values)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if user.token_version != version:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+        return user
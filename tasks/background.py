@@ -0,0 +1,79 @@
+"""
+Lightweight background execution for work that should not block requests.
+
+Jobs run on a bounded thread pool inside the web process, CPU heavy image
+work is handed to a process pool. With BACKGROUND_TASKS_EAGER (tests) jobs
+run inline.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_thread_pool = None
+_process_pool = None
+_lock = threading.Lock()
+
+
+def is_eager():
+    return getattr(settings, 'BACKGROUND_TASKS_EAGER', False)
+
+
+def get_thread_pool():
+    global _thread_pool
+    if _thread_pool is None:
+        with _lock:
+            if _thread_pool is None:
+                _thread_pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+                    thread_name_prefix='background'
+                )
+    return _thread_pool
+
+
+def get_process_pool():
+    """Process pool for CPU bound work (spawned, so it is safe next to threads)"""
+    global _process_pool
+    if _process_pool is None:
+        with _lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_PROCESSING_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _process_pool
+
+
+def run_cpu_bound(func, *args):
+    """Runs a picklable function in the process pool and waits for the result"""
+    if is_eager():
+        return func(*args)
+    return get_process_pool().submit(func, *args).result()
+
+
+def _run_job(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background job {func.__name__} failed")
+    finally:
+        connection.close()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Runs a job on the background thread pool"""
+    if is_eager():
+        func(*args, **kwargs)
+        return
+    get_thread_pool().submit(_run_job, func, args, kwargs)
+
+
+def run_after_commit(func, *args, **kwargs):
+    """Runs a job in the background once the current transaction is committed"""
+    transaction.on_commit(lambda: run_in_background(func, *args, **kwargs))
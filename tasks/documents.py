@@ -0,0 +1,544 @@
+"""
+Saving and processing uploaded task documents.
+
+Uploads are stored content addressed: files are hashed (SHA-256) while
+streaming and identical content shares one reference counted storage
+object (DocumentBlob). Files are hashed and written concurrently on a
+bounded thread pool and the document rows are inserted with a single
+bulk_create. After the upload, photos are downscaled/normalized and
+thumbnails are generated in the background.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .background import run_after_commit, run_cpu_bound
+from .images import (
+    image_dimensions,
+    is_image_name,
+    is_photo_name,
+    make_thumbnail,
+    normalize_photo,
+    thumbnail_name
+)
+from .models import DocumentBlob, Task, TaskDocument
+from .realtime import publish_task_event
+from .storage import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+# Task counter of each document type
+DOCUMENT_COUNT_FIELDS = {
+    'beginning': 'starting_document_count',
+    'ending': 'ending_document_count',
+}
+
+BLOB_PREFIX = 'task_documents/blobs'
+
+# S3 DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+StoredBlob = namedtuple('StoredBlob', ['checksum', 'name', 'size', 'content_type', 'width', 'height'])
+
+_executor = None
+_executor_lock = threading.Lock()
+_deletions = threading.local()
+
+
+def get_upload_executor():
+    """
+    Returns the process wide upload thread pool.
+    Threads are long lived, so each keeps its own storage connection alive between requests.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'DOCUMENT_UPLOAD_WORKERS', 4),
+                    thread_name_prefix='document-upload'
+                )
+    return _executor
+
+
+def _storage():
+    return TaskDocument._meta.get_field('file').storage
+
+
+def compute_checksum(file):
+    """Streams a file through SHA-256, returns the hex digest and the size"""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+
+def inspect_file(file):
+    """
+    Reads the metadata of an upload: SHA-256, size, content type and image dimensions.
+    Values computed by HashingUploadHandler while the upload was received are reused.
+    """
+    checksum = getattr(file, 'sha256', None)
+    if checksum:
+        size = file.size
+    else:
+        checksum, size = compute_checksum(file)
+    content_type = (
+        getattr(file, 'content_type', None)
+        or mimetypes.guess_type(file.name or '')[0]
+        or 'application/octet-stream'
+    )
+    width = height = None
+    if content_type.startswith('image/') or is_image_name(file.name):
+        width, height = getattr(file, 'image_size', None) or image_dimensions(file)
+    return checksum, size, content_type, width, height
+
+
+def apply_blob_metadata(document, blob):
+    document.checksum = blob.checksum
+    document.size = blob.size
+    document.content_type = blob.content_type
+    document.width = blob.width
+    document.height = blob.height
+
+
+def blob_name(checksum, filename):
+    """Content addressed storage key, the extension is kept for content type detection"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,10}', extension):
+        extension = ''
+    return f"{BLOB_PREFIX}/{checksum[:2]}/{checksum[2:4]}/{checksum}{extension}"
+
+
+def _count_case(field, counts):
+    return Case(
+        *[When(**{field: key}, then=Value(count)) for key, count in counts.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def _write_blob(name, file):
+    storage = _storage()
+    # Identical content is already stored under this key
+    if storage.exists(name):
+        return
+    saved_name = storage.save(name, file)
+    if saved_name != name:
+        # Another upload stored the same content meanwhile
+        storage.delete(saved_name)
+
+
+def upload_blobs(files):
+    """
+    Hashes the files and writes the ones whose content is not stored yet, in parallel.
+    Returns (StoredBlob, None) or (None, error) per file.
+    References are only added by register_blobs.
+    """
+    executor = get_upload_executor()
+    inspections = [executor.submit(inspect_file, file) for file in files]
+
+    results = []
+    for file, future in zip(files, inspections):
+        try:
+            checksum, size, content_type, width, height = future.result()
+        except Exception as e:
+            results.append((None, e))
+            continue
+        name = blob_name(checksum, file.name)
+        results.append((StoredBlob(checksum, name, size, content_type, width, height), None))
+
+    checksums = {blob.checksum for blob, _ in results if blob}
+    known = dict(DocumentBlob.objects.filter(checksum__in=checksums).values_list('checksum', 'file'))
+
+    # Each new content is written once, even if it appears several times
+    writes = {}
+    for index, (blob, _) in enumerate(results):
+        if blob is None:
+            continue
+        if blob.checksum in known:
+            results[index] = (blob._replace(name=known[blob.checksum]), None)
+        elif blob.checksum not in writes:
+            writes[blob.checksum] = executor.submit(_write_blob, blob.name, files[index])
+
+    for index, (blob, _) in enumerate(results):
+        if blob is not None and blob.checksum in writes:
+            try:
+                writes[blob.checksum].result()
+            except Exception as e:
+                results[index] = (None, e)
+
+    return results
+
+
+def register_blobs(blobs, files):
+    """
+    Adds one reference per blob, creating missing rows.
+    Returns {checksum: storage name}. Must run in the transaction that creates the documents.
+
+    The rows are locked, so a concurrent release cannot delete them meanwhile.
+    Rows that had no live reference (new, or released and waiting for
+    deletion) may point to an object that was already removed, upload_blobs
+    skipped the write for them, so the object is written again if missing.
+    """
+    counts = Counter(blob.checksum for blob in blobs)
+    unique = {blob.checksum: (blob, file) for blob, file in zip(blobs, files)}
+
+    DocumentBlob.objects.bulk_create(
+        [DocumentBlob(checksum=blob.checksum, file=blob.name, size=blob.size) for blob, _ in unique.values()],
+        ignore_conflicts=True
+    )
+    rows = {
+        row.checksum: row for row in
+        DocumentBlob.objects.select_for_update().filter(checksum__in=counts).only('checksum', 'file', 'ref_count')
+    }
+    for checksum, row in rows.items():
+        if row.ref_count <= 0:
+            file = unique[checksum][1]
+            file.seek(0)
+            _write_blob(row.file.name, file)
+
+    DocumentBlob.objects.filter(checksum__in=counts).update(
+        ref_count=F('ref_count') + _count_case('checksum', counts)
+    )
+    return {checksum: row.file.name for checksum, row in rows.items()}
+
+
+def release_blobs(names):
+    """
+    Drops one reference per name.
+    Returns the names whose storage objects are not referenced anymore:
+    blobs whose last reference went away and files that are not blobs (uploaded before deduplication).
+    Rows of dead blobs are kept until delete_storage_objects removes them with their objects.
+    """
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return set()
+
+    with transaction.atomic():
+        blob_names = set(DocumentBlob.objects.filter(file__in=counts).values_list('file', flat=True))
+        dead = set()
+        if blob_names:
+            DocumentBlob.objects.filter(file__in=blob_names).update(
+                ref_count=F('ref_count') - _count_case('file', {name: counts[name] for name in blob_names})
+            )
+            dead = set(DocumentBlob.objects.filter(file__in=blob_names, ref_count__lte=0).values_list('file', flat=True))
+
+    return dead | (set(counts) - blob_names)
+
+
+def referenced_names(names):
+    """Names still used by a live blob or a document (referenced again, or their delete was rolled back)"""
+    referenced = set(
+        DocumentBlob.objects.filter(file__in=names, ref_count__gt=0).values_list('file', flat=True)
+    )
+    for row in TaskDocument.objects.filter(
+        Q(file__in=names) | Q(original_file__in=names) | Q(thumbnail__in=names)
+    ).values_list('file', 'original_file', 'thumbnail'):
+        referenced.update(row)
+    return referenced
+
+
+def delete_storage_objects(names):
+    """
+    Deletes storage objects that are not referenced anymore.
+    S3 objects are removed with DeleteObjects, up to 1000 keys per request.
+    """
+    names = sorted(set(name for name in names if name))
+    storage = _storage()
+    client = get_s3_client(storage)
+
+    for start in range(0, len(names), DELETE_BATCH_SIZE):
+        with transaction.atomic():
+            # Blob rows stay locked until their objects are gone, register_blobs waits for them
+            batch = names[start:start + DELETE_BATCH_SIZE]
+            list(DocumentBlob.objects.select_for_update().filter(file__in=batch).values_list('id', flat=True))
+            referenced = referenced_names(batch)
+            batch = [name for name in batch if name not in referenced]
+            if not batch:
+                continue
+
+            _delete_objects(storage, client, batch)
+            DocumentBlob.objects.filter(file__in=batch, ref_count__lte=0).delete()
+
+
+def _delete_objects(storage, client, names):
+    if client is None:
+        for name in names:
+            try:
+                storage.delete(name)
+            except Exception as e:
+                logger.error(f"Storage object {name} could not be deleted: {e}")
+        return
+
+    try:
+        response = client.delete_objects(
+            Bucket=storage.bucket_name,
+            Delete={'Objects': [{'Key': storage._normalize_name(name)} for name in names], 'Quiet': True}
+        )
+    except Exception as e:
+        logger.error(f"{len(names)} storage objects could not be deleted: {e}")
+        return
+    for error in response.get('Errors', []):
+        logger.error(f"Storage object {error.get('Key')} could not be deleted: {error.get('Message')}")
+
+
+def adjust_document_counts(changes):
+    """Applies {(task_id, document_type): delta} to the task document counters with F() updates"""
+    for (task_id, document_type), delta in changes.items():
+        field = DOCUMENT_COUNT_FIELDS.get(document_type)
+        if field and delta:
+            Task.objects.filter(pk=task_id).update(**{field: F(field) + delta})
+
+
+def schedule_storage_deletion(names):
+    """
+    Deletes storage objects after the current transaction commits.
+    Callers pass whole batches (delete_document_files), each batch is one on_commit callback.
+    """
+    names = set(name for name in names if name)
+    if names:
+        transaction.on_commit(partial(delete_storage_objects, names))
+
+
+def delete_document_files(documents):
+    """
+    Releases the files of deleted documents, unreferenced objects are deleted after commit.
+    The task counters are decremented once per task and type.
+    """
+    changes = Counter()
+    for document in documents:
+        changes[(document.task_id, document.document_type)] -= 1
+    adjust_document_counts(changes)
+
+    image_format = getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP')
+    for start in range(0, len(documents), DELETE_BATCH_SIZE // 2):
+        batch = documents[start:start + DELETE_BATCH_SIZE // 2]
+        names = []
+        for document in batch:
+            names += [document.file.name, document.original_file.name]
+        removed = release_blobs(names)
+
+        to_delete = set(removed)
+        for name in removed:
+            if is_image_name(name):
+                to_delete.add(thumbnail_name(name, image_format))
+        for document in batch:
+            if document.thumbnail and document.file.name in removed:
+                to_delete.add(document.thumbnail.name)
+
+        schedule_storage_deletion(to_delete)
+
+
+def document_deleted(document):
+    """Called for every deleted document (post_delete), including cascades"""
+    batch = getattr(_deletions, 'documents', None)
+    if batch is not None:
+        batch.append(document)
+    else:
+        delete_document_files([document])
+
+
+@contextmanager
+def batched_document_deletion():
+    """
+    Documents deleted inside the block (directly or by cascade) release their
+    files together when the block ends, instead of a few queries per document.
+    """
+    if getattr(_deletions, 'documents', None) is not None:
+        # Nested block, the outer one releases
+        yield
+        return
+
+    _deletions.documents = []
+    try:
+        with transaction.atomic():
+            yield
+            documents, _deletions.documents = _deletions.documents, None
+            delete_document_files(documents)
+    finally:
+        _deletions.documents = None
+
+
+def save_task_documents(task, document_type, files, user):
+    """
+    Stores uploaded files and creates their TaskDocument rows.
+
+    Returns the created documents and a list of per file errors
+    ({'file': name, 'error': message}) for files that could not be stored.
+    """
+    if not files:
+        return [], []
+
+    stored = []
+    stored_files = []
+    errors = []
+    for uploaded_file, (blob, error) in zip(files, upload_blobs(files)):
+        if error is not None:
+            logger.error(f"Error saving document {uploaded_file.name} for task {task.id}: {error}")
+            errors.append({'file': uploaded_file.name, 'error': str(error)})
+            continue
+        stored.append(blob)
+        stored_files.append(uploaded_file)
+
+    if not stored:
+        return [], errors
+
+    with transaction.atomic():
+        names = register_blobs(stored, stored_files)
+        documents = []
+        for blob in stored:
+            document = TaskDocument(
+                task=task,
+                document_type=document_type,
+                file=names[blob.checksum],
+                uploaded_by=user
+            )
+            apply_blob_metadata(document, blob)
+            documents.append(document)
+        TaskDocument.objects.bulk_create(documents)
+        documents_added(task, document_type, documents)
+
+    return documents, errors
+
+
+def documents_added(task, document_type, documents):
+    """
+    Counts new documents on the task, publishes them and schedules their processing.
+    Called by the post_save signal and explicitly after bulk_create (which sends no signals),
+    in the transaction that created the documents.
+    """
+    if not documents:
+        return
+
+    adjust_document_counts({(task.pk, document_type): len(documents)})
+
+    document_ids = [document.id for document in documents]
+    publish_task_event(
+        task,
+        'task.document_added',
+        document_ids=document_ids,
+        document_type=document_type
+    )
+    run_after_commit(process_documents, document_ids)
+
+
+def generate_thumbnail(document, force=False):
+    """
+    Creates the thumbnail of an image document, returns False for other files.
+    Documents sharing a blob share its thumbnail.
+    """
+    if not is_image_name(document.file.name):
+        return False
+
+    storage = document.file.storage
+    image_format = getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP')
+    name = thumbnail_name(document.file.name, image_format)
+
+    if force or not storage.exists(name):
+        with document.file.open('rb') as original:
+            data = original.read()
+
+        thumbnail = run_cpu_bound(
+            make_thumbnail,
+            data,
+            tuple(getattr(settings, 'THUMBNAIL_SIZE', (320, 320))),
+            image_format,
+            getattr(settings, 'THUMBNAIL_QUALITY', 80)
+        )
+
+        # Replace an existing thumbnail (regeneration)
+        if storage.exists(name):
+            storage.delete(name)
+        name = storage.save(name, ContentFile(thumbnail))
+
+    TaskDocument.objects.filter(pk=document.pk).update(thumbnail=name)
+    document.thumbnail.name = name
+    return True
+
+
+def normalize_document(document):
+    """
+    Re-encodes a large camera photo (downscaled, EXIF orientation applied, metadata stripped).
+    The original is kept in original_file when PHOTO_KEEP_ORIGINAL is set.
+    Returns the number of bytes saved.
+    """
+    if not is_photo_name(document.file.name):
+        return 0
+
+    with document.file.open('rb') as original:
+        data = original.read()
+
+    result = run_cpu_bound(
+        normalize_photo,
+        data,
+        getattr(settings, 'PHOTO_MAX_DIMENSION', 2560),
+        getattr(settings, 'PHOTO_MAX_BYTES', 2097152),
+        getattr(settings, 'PHOTO_QUALITY', 82)
+    )
+    if result is None:
+        return 0
+
+    original_name = document.file.name
+    keep_original = getattr(settings, 'PHOTO_KEEP_ORIGINAL', False)
+
+    # The normalized photo is new content, so it gets its own blob
+    normalized = ContentFile(result, name=original_name)
+    blob, error = upload_blobs([normalized])[0]
+    if error is not None:
+        raise error
+
+    bytes_saved = len(data) - len(result)
+    with transaction.atomic():
+        new_name = register_blobs([blob], [normalized])[blob.checksum]
+        TaskDocument.objects.filter(pk=document.pk).update(
+            file=new_name,
+            original_file=original_name if keep_original else '',
+            bytes_saved=bytes_saved,
+            checksum=blob.checksum,
+            size=blob.size,
+            content_type='image/jpeg',
+            width=blob.width,
+            height=blob.height
+        )
+        if not keep_original:
+            # The reference moves to the normalized blob
+            schedule_storage_deletion(release_blobs([original_name]))
+
+    document.file.name = new_name
+    if keep_original:
+        document.original_file.name = original_name
+
+    logger.info(f"Document {document.id} normalized, {bytes_saved} bytes saved")
+    return bytes_saved
+
+
+def process_documents(document_ids):
+    """Background job: normalizes photos and creates thumbnails of new documents"""
+    documents = TaskDocument.objects.filter(id__in=document_ids, processed_at__isnull=True)
+    for document in documents:
+        try:
+            if getattr(settings, 'PHOTO_NORMALIZATION_ENABLED', True):
+                normalize_document(document)
+            if not document.thumbnail:
+                generate_thumbnail(document)
+        except Exception as e:
+            logger.error(f"Document {document.id} could not be processed: {e}")
+            continue
+        TaskDocument.objects.filter(pk=document.pk).update(processed_at=timezone.now())
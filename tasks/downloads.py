@@ -0,0 +1,66 @@
+"""
+Protected document downloads.
+
+The API only checks access, the bytes are not streamed through Python in
+production: S3 objects are served through a short lived presigned redirect,
+or fetched by nginx itself after an X-Accel-Redirect. S3 and nginx both
+answer Range requests, so large videos can be seeked.
+"""
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.http import content_disposition_header
+
+from .storage import get_s3_client
+
+# Internal nginx locations (nginx/nginx.conf), not reachable from outside
+ACCEL_MEDIA_PREFIX = '/protected/media/'
+ACCEL_S3_LOCATION = '/protected/s3/'
+
+
+def presigned_download_url(name, filename, storage):
+    """Short lived GET URL of a private S3 object"""
+    client = get_s3_client(storage)
+    return client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': storage.bucket_name,
+            'Key': storage._normalize_name(name),
+            'ResponseContentDisposition': content_disposition_header(False, filename),
+        },
+        ExpiresIn=getattr(settings, 'DOCUMENT_DOWNLOAD_EXPIRES', 60)
+    )
+
+
+def download_response(file, filename, content_type=None):
+    """
+    Serves a stored file according to DOCUMENT_DOWNLOAD_MODE:
+    'redirect' (presigned URL, S3 only), 'accel' (X-Accel-Redirect) or
+    'direct' (streamed by Django, for development without nginx).
+    """
+    mode = getattr(settings, 'DOCUMENT_DOWNLOAD_MODE', 'redirect')
+    storage = file.storage
+    is_s3 = get_s3_client(storage) is not None
+
+    if is_s3 and mode == 'redirect':
+        response = HttpResponseRedirect(presigned_download_url(file.name, filename, storage))
+        # The URL expires, it must not be cached
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+    if mode == 'accel':
+        response = HttpResponse(content_type=content_type)
+        if not content_type:
+            # nginx picks the type of the served file
+            del response['Content-Type']
+        if is_s3:
+            # nginx proxies the presigned URL, the key is passed unchanged in a header
+            response['X-Accel-Redirect'] = ACCEL_S3_LOCATION
+            response['X-Download-Url'] = presigned_download_url(file.name, filename, storage)
+        else:
+            response['X-Accel-Redirect'] = ACCEL_MEDIA_PREFIX + quote(file.name)
+        response['Content-Disposition'] = content_disposition_header(False, filename)
+        return response
+
+    return FileResponse(file.open('rb'), filename=filename, content_type=content_type or None)
@@ -0,0 +1,66 @@
+"""
+Distance helpers for task coordinates.
+
+Nearby queries first narrow the tasks down with a latitude/longitude
+bounding box, which the task_location_idx index answers, and then compute
+the exact haversine distance only for the candidates inside the box.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Returns (min_lat, max_lat, min_lng, max_lng) of a box containing every point
+    within radius_km. Longitudes may fall outside -180..180 near the antimeridian,
+    bounding_box_filter wraps them.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = lat - lat_delta, lat + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle contains a pole, every longitude is in range
+        return max(min_lat, -90), min(max_lat, 90), -180, 180
+
+    lng_delta = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    return min_lat, max_lat, lng - lng_delta, lng + lng_delta
+
+
+def bounding_box_filter(lat, lng, radius_km, prefix=''):
+    """Q object selecting rows whose latitude/longitude fall in the bounding box"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    condition = Q(**{f'{prefix}latitude__range': (min_lat, max_lat)})
+
+    if max_lng - min_lng >= 360:
+        return condition & Q(**{f'{prefix}longitude__isnull': False})
+    if min_lng < -180:
+        return condition & (Q(**{f'{prefix}longitude__gte': min_lng + 360}) | Q(**{f'{prefix}longitude__lte': max_lng}))
+    if max_lng > 180:
+        return condition & (Q(**{f'{prefix}longitude__gte': min_lng}) | Q(**{f'{prefix}longitude__lte': max_lng - 360}))
+    return condition & Q(**{f'{prefix}longitude__range': (min_lng, max_lng)})
+
+
+def haversine_expression(lat, lng, prefix=''):
+    """Database expression of the distance in kilometres from (lat, lng) to the row's coordinates"""
+    row_lat = Radians(Cast(F(f'{prefix}latitude'), FloatField()))
+    row_lng = Radians(Cast(F(f'{prefix}longitude'), FloatField()))
+    origin_lat = math.radians(lat)
+    origin_lng = math.radians(lng)
+
+    a = (
+        Power(Sin((row_lat - origin_lat) / 2), 2)
+        + math.cos(origin_lat) * Cos(row_lat) * Power(Sin((row_lng - origin_lng) / 2), 2)
+    )
+    # Rounding can push the square root slightly above 1
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(a), Value(1.0)))
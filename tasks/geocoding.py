@@ -0,0 +1,169 @@
+"""
+Coordinates for task addresses.
+
+Tasks saved with an address but without coordinates are geocoded in the
+background. Lookups go through an in-process LRU, then the GeocodeCache
+table and only then to the configured provider (GEOCODING_PROVIDER), so a
+repeated site address never reaches the provider twice.
+"""
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+import urllib.parse
+import urllib.request
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import GeocodeCache, Task
+
+logger = logging.getLogger(__name__)
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+class GeocodingError(Exception):
+    """The provider could not be reached, the lookup is not cached"""
+
+
+def normalize_address(address):
+    """Case, punctuation and whitespace insensitive form of an address"""
+    address = unicodedata.normalize('NFKC', address or '').casefold()
+    # Turkish dotted/dotless i: 'İ' casefolds to 'i' + combining dot, 'I' to 'i' instead of 'ı'
+    address = address.replace('\u0307', '').replace('ı', 'i')
+    address = re.sub(r'[,.;:()"\']+', ' ', address)
+    return ' '.join(address.split())[:500]
+
+
+class NominatimGeocoder:
+    """OpenStreetMap Nominatim (or a compatible self-hosted) search API"""
+
+    def __init__(self):
+        self.url = getattr(settings, 'GEOCODING_URL', 'https://nominatim.openstreetmap.org/search')
+        self.user_agent = getattr(settings, 'GEOCODING_USER_AGENT', 'WorkFlow')
+        self.timeout = getattr(settings, 'GEOCODING_TIMEOUT', 10)
+        # The public instance allows one request per second
+        self.min_interval = getattr(settings, 'GEOCODING_MIN_INTERVAL', 1.0)
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+
+    def geocode(self, address):
+        with self._lock:
+            wait = self._last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
+
+        query = urllib.parse.urlencode({'q': address, 'format': 'jsonv2', 'limit': 1})
+        request = urllib.request.Request(f'{self.url}?{query}', headers={'User-Agent': self.user_agent})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                results = json.load(response)
+        except (OSError, ValueError) as e:
+            raise GeocodingError(str(e)) from e
+        if not results:
+            return None
+        return float(results[0]['lat']), float(results[0]['lon'])
+
+
+class FixtureGeocoder:
+    """
+    Offline provider for tests and development. Answers from GEOCODING_FIXTURE,
+    a JSON file (or dict) of address -> [latitude, longitude].
+    """
+
+    def __init__(self):
+        fixture = getattr(settings, 'GEOCODING_FIXTURE', {})
+        if isinstance(fixture, str) and fixture:
+            with open(fixture, encoding='utf-8') as f:
+                fixture = json.load(f)
+        self.addresses = {normalize_address(address): tuple(point) for address, point in (fixture or {}).items()}
+        self.calls = 0
+
+    def geocode(self, address):
+        self.calls += 1
+        return self.addresses.get(normalize_address(address))
+
+
+def get_geocoder():
+    """Returns the configured provider (created once per process), None if geocoding is disabled"""
+    global _geocoder
+    backend = getattr(settings, 'GEOCODING_PROVIDER', '')
+    if not backend:
+        return None
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = import_string(backend)()
+    return _geocoder
+
+
+@receiver(setting_changed)
+def reset_geocoder(setting=None, **kwargs):
+    global _geocoder
+    if setting is None or setting.startswith('GEOCODING_'):
+        _geocoder = None
+        _lookup.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def _lookup(address):
+    """(latitude, longitude) or None for a normalized address, provider errors are not cached"""
+    cached = GeocodeCache.objects.filter(address=address).values_list('latitude', 'longitude').first()
+    if cached is not None:
+        return None if cached[0] is None else cached
+
+    geocoder = get_geocoder()
+    point = geocoder.geocode(address)
+    if point is not None:
+        point = tuple(Decimal(str(round(value, 6))) for value in point)
+    entry, _ = GeocodeCache.objects.get_or_create(address=address, defaults={
+        'latitude': point[0] if point else None,
+        'longitude': point[1] if point else None,
+        'provider': type(geocoder).__name__
+    })
+    return None if entry.latitude is None else (entry.latitude, entry.longitude)
+
+
+def geocode(address):
+    """Coordinates of an address as Decimals, None if unknown or geocoding is disabled"""
+    address = normalize_address(address)
+    if not address or get_geocoder() is None:
+        return None
+    return _lookup(address)
+
+
+def geocode_task(task_id):
+    """Fills in missing coordinates of a task from its address (background job)"""
+    task = Task.objects.filter(pk=task_id).first()
+    if task is None or not task.address or (task.latitude is not None and task.longitude is not None):
+        return
+
+    address = task.address
+    try:
+        point = geocode(address)
+    except GeocodingError as e:
+        logger.warning(f"Address of task {task_id} could not be geocoded: {e}")
+        return
+    if point is None:
+        return
+
+    with transaction.atomic():
+        # Coordinates or address may have been edited during the lookup
+        task = Task.objects.select_for_update().filter(pk=task_id).first()
+        if task is None or normalize_address(task.address) != normalize_address(address):
+            return
+        if task.latitude is not None and task.longitude is not None:
+            return
+        task.latitude, task.longitude = point
+        # Saved (not updated) so route caches and real-time clients see the coordinates
+        task.save(update_fields=['latitude', 'longitude'])
@@ -0,0 +1,104 @@
+"""
+Image processing for task documents.
+
+Functions here only work on bytes so they can run in a separate process.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps, ExifTags
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tif', '.tiff', '.heic')
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg')
+
+# Metadata above this size (EXIF thumbnails, maker notes, XMP) is worth stripping
+BULKY_METADATA_BYTES = 16384
+
+FORMAT_EXTENSIONS = {
+    'WEBP': '.webp',
+    'JPEG': '.jpg',
+}
+
+
+def is_image_name(name):
+    return bool(name) and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def is_photo_name(name):
+    return bool(name) and name.lower().endswith(PHOTO_EXTENSIONS)
+
+
+def image_dimensions(file):
+    """Reads width and height from the image header, (None, None) if it is not an image"""
+    try:
+        with Image.open(file) as image:
+            return image.size
+    except Exception:
+        return None, None
+    finally:
+        file.seek(0)
+
+
+def thumbnail_name(name, image_format='WEBP'):
+    """Thumbnail is stored next to the original: photo.jpg -> photo_thumb.webp"""
+    root, _ = os.path.splitext(name)
+    return f"{root}_thumb{FORMAT_EXTENSIONS[image_format]}"
+
+
+def make_thumbnail(data, size=(320, 320), image_format='WEBP', quality=80):
+    """Returns a thumbnail of the image that fits in size"""
+    with Image.open(io.BytesIO(data)) as image:
+        # Let the JPEG decoder downscale while decoding
+        image.draft('RGB', (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if image_format == 'JPEG' or not has_alpha:
+            image = image.convert('RGB')
+        else:
+            image = image.convert('RGBA')
+
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=quality)
+        return output.getvalue()
+
+
+def normalize_photo(data, max_dimension=2560, max_bytes=2097152, quality=82):
+    """
+    Downscales a camera photo, applies its EXIF orientation and strips metadata.
+    Returns the re-encoded JPEG, or None when the photo is already fine.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if image.format != 'JPEG':
+            return None
+
+        orientation = image.getexif().get(ExifTags.Base.Orientation, 1)
+        metadata_bytes = sum(len(value) for key, value in image.info.items()
+                             if isinstance(value, bytes) and key != 'icc_profile')
+        needs_processing = (
+            max(image.size) > max_dimension
+            or len(data) > max_bytes
+            or orientation != 1
+            or metadata_bytes > BULKY_METADATA_BYTES
+        )
+        if not needs_processing:
+            return None
+
+        icc_profile = image.info.get('icc_profile')
+        image.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # EXIF is not passed on save, so metadata is dropped. Color profile is kept.
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True,
+                   icc_profile=icc_profile)
+        result = output.getvalue()
+
+    # Re-encoding only for metadata must not make the file bigger
+    if orientation == 1 and len(result) >= len(data):
+        return None
+    return result
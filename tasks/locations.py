@@ -0,0 +1,153 @@
+"""
+Worker location check-ins.
+
+Phones send their GPS pings in batches. Pings are appended to LocationPing
+with one bulk insert per request and the newest one moves the worker's row
+in WorkerLocation, which the manager map reads (one row per worker).
+
+On PostgreSQL LocationPing is partitioned by day of recorded_at (migration
+0015), so expired days are removed with DROP TABLE instead of a DELETE.
+maintain_location_partitions (looped by the locations-* compose service)
+creates the coming days and drops the ones past LOCATION_RETENTION_DAYS. Requests never create partitions, pings
+of a day without one are rejected (PartitionMissing) and sent again by the
+phone later.
+"""
+import datetime
+import logging
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import LocationPing, WorkerLocation
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = 'tasks_locationping'
+PARTITION_NAME = re.compile(r'^tasks_locationping_p(\d{8})$')
+
+
+def is_partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def partition_name(day):
+    return f'{PARTITIONED_TABLE}_p{day:%Y%m%d}'
+
+
+def partitions():
+    """Names of the existing partitions (Django's introspection leaves them out)"""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s ORDER BY child.relname',
+            [PARTITIONED_TABLE]
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def create_partitions(start_day, days):
+    """Creates the daily partitions (UTC days) from start_day on, existing ones are kept"""
+    if not is_partitioned():
+        return
+    with connection.cursor() as cursor:
+        for offset in range(days):
+            day = start_day + datetime.timedelta(days=offset)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {PARTITIONED_TABLE} '
+                f"FOR VALUES FROM ('{day:%Y-%m-%d} 00:00:00+00') TO ('{day + datetime.timedelta(days=1):%Y-%m-%d} 00:00:00+00')"
+            )
+
+
+def drop_expired_pings(before_day, batch_size=10000):
+    """
+    Removes pings recorded before before_day. Partitions are dropped whole,
+    without partitioning the rows are deleted in batches. Returns the dropped
+    partition names (or the number of deleted rows).
+    """
+    if not is_partitioned():
+        cutoff = datetime.datetime.combine(before_day, datetime.time.min, tzinfo=datetime.timezone.utc)
+        deleted = 0
+        while True:
+            ids = list(LocationPing.objects.filter(recorded_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += LocationPing.objects.filter(id__in=ids).delete()[0]
+
+    dropped = []
+    with connection.cursor() as cursor:
+        for name in partitions():
+            match = PARTITION_NAME.match(name)
+            if match and datetime.datetime.strptime(match.group(1), '%Y%m%d').date() < before_day:
+                cursor.execute(f'DROP TABLE IF EXISTS {name}')
+                dropped.append(name)
+    return dropped
+
+
+def accepted_range(now=None):
+    """Pings recorded outside this range are rejected (clock errors, backlogs older than a day)"""
+    now = now or timezone.now()
+    return (
+        now - datetime.timedelta(hours=settings.LOCATION_MAX_AGE_HOURS),
+        now + datetime.timedelta(minutes=5)
+    )
+
+
+class PartitionMissing(Exception):
+    """A ping falls on a day without partition, maintain_location_partitions has not run"""
+
+
+def _insert_pings(pings):
+    # Partitions are only created by maintain_location_partitions: CREATE TABLE ... PARTITION OF
+    # locks the parent table, which must not happen inside a request
+    try:
+        with transaction.atomic():
+            LocationPing.objects.bulk_create(pings, batch_size=1000)
+    except IntegrityError as e:
+        if not is_partitioned() or 'no partition of relation' not in str(e):
+            raise
+        days = sorted({ping.recorded_at.astimezone(datetime.timezone.utc).date() for ping in pings})
+        logger.error(f"Location partitions are missing for {days[0]}..{days[-1]}, run maintain_location_partitions")
+        raise PartitionMissing(f'{days[0]}..{days[-1]}') from e
+
+
+def record_checkins(worker, points):
+    """
+    Stores validated points (dicts of latitude, longitude, recorded_at, accuracy)
+    of a worker and moves the worker's latest position. Returns (accepted, rejected).
+    Raises PartitionMissing if a point's day has no partition yet.
+    """
+    earliest, latest = accepted_range()
+    now = timezone.now()
+    pings = [
+        LocationPing(worker=worker, received_at=now, **point)
+        for point in points
+        if earliest <= point['recorded_at'] <= latest
+    ]
+    if not pings:
+        return 0, len(points)
+
+    with transaction.atomic():
+        _insert_pings(pings)
+
+        newest = max(pings, key=lambda ping: ping.recorded_at)
+        values = {
+            'latitude': newest.latitude,
+            'longitude': newest.longitude,
+            'accuracy': newest.accuracy,
+            'recorded_at': newest.recorded_at,
+            'updated_at': now
+        }
+        # Only moves forward, older batches (sent late) do not overwrite a newer position
+        updated = WorkerLocation.objects.filter(
+            worker=worker, recorded_at__lt=newest.recorded_at
+        ).update(**values)
+        if not updated:
+            WorkerLocation.objects.get_or_create(worker=worker, defaults=values)
+
+    return len(pings), len(points) - len(pings)
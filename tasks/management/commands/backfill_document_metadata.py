@@ -0,0 +1,85 @@
+import hashlib
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tasks.images import image_dimensions, is_image_name
+from tasks.models import DocumentBlob, TaskDocument
+from tasks.storage import iter_object_chunks
+
+FIELDS = ['checksum', 'size', 'content_type', 'width', 'height']
+
+
+def _read_metadata(document, blob=None):
+    """Fills the metadata of a document, the file is only streamed when it is not a known blob"""
+    try:
+        name = document.file.name
+        if blob is not None:
+            document.checksum, document.size = blob
+        else:
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in iter_object_chunks(name, storage=document.file.storage):
+                digest.update(chunk)
+                size += len(chunk)
+            document.checksum, document.size = digest.hexdigest(), size
+
+        document.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if is_image_name(name):
+            # Pillow only reads the header
+            with document.file.open('rb') as file:
+                document.width, document.height = image_dimensions(file)
+        return None
+    except Exception as e:
+        return e
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Fills size, content type, dimensions and checksum of documents uploaded before they were stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Documents loaded per query')
+        parser.add_argument('--workers', type=int, default=settings.DOCUMENT_UPLOAD_WORKERS,
+                            help='Files read in parallel')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = TaskDocument.objects.filter(checksum='').only('id', 'file', *FIELDS).order_by('id')
+
+        updated = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                # Keyset pagination, failed documents are not loaded again
+                batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                # Deduplicated files already know their checksum and size
+                blobs = {
+                    name: (checksum, size)
+                    for name, checksum, size in DocumentBlob.objects.filter(
+                        file__in=[document.file.name for document in batch]
+                    ).values_list('file', 'checksum', 'size')
+                }
+                errors = executor.map(lambda document: _read_metadata(document, blobs.get(document.file.name)), batch)
+
+                done = []
+                for document, error in zip(batch, errors):
+                    if error is not None:
+                        failed += 1
+                        self.stderr.write(f"Document {document.id}: {error}")
+                    else:
+                        done.append(document)
+                TaskDocument.objects.bulk_update(done, FIELDS)
+                updated += len(done)
+
+                self.stdout.write(f"Processed documents up to id {last_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"Documents updated: {updated}, failed: {failed}"))
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from tasks.models import User
+from tasks.serializers import EmailTokenObtainPairSerializer
+
+EMAIL = 'login-benchmark@example.com'
+PASSWORD = 'Benchmark-Password1'
+
+
+class Command(BaseCommand):
+    help = 'Measures logins per second of one worker (token issuance including the password hash)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Logins to run')
+
+    def handle(self, *args, **options):
+        count = options['logins']
+
+        # The benchmark user is rolled back at the end
+        with transaction.atomic():
+            User.objects.create_user(username=EMAIL, email=EMAIL, password=PASSWORD, role='worker')
+
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(count):
+                    serializer = EmailTokenObtainPairSerializer(data={'email': EMAIL, 'password': PASSWORD})
+                    serializer.is_valid(raise_exception=True)
+            elapsed = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{count} logins in {elapsed:.2f}s: {count / elapsed:.1f} logins/s per worker, "
+            f"{elapsed / count * 1000:.1f}ms and {len(queries) / count:.1f} queries per login "
+            f"(PBKDF2 iterations: {settings.PASSWORD_HASH_ITERATIONS})"
+        )
@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from tasks.models import Task, User
+from tasks.views import nearby_tasks
+
+# Turkey, roughly
+MIN_LAT, MAX_LAT = 36.0, 42.0
+MIN_LNG, MAX_LNG = 26.0, 45.0
+
+
+class Command(BaseCommand):
+    help = 'Measures /api/tasks/nearby/ query latency on generated geotagged tasks (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000000, help='Generated tasks')
+        parser.add_argument('--queries', type=int, default=200, help='Nearby queries to run')
+        parser.add_argument('--radius', type=float, default=5, help='Radius in km')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+
+        with transaction.atomic():
+            manager = User.objects.create_user(
+                username='nearby-benchmark@example.com', email='nearby-benchmark@example.com',
+                password=None, role='site_manager'
+            )
+
+            self.stdout.write(f"Creating {options['tasks']} tasks...")
+            start_date = due_date = manager.date_joined
+            batch = []
+            for index in range(options['tasks']):
+                batch.append(Task(
+                    title=f'Task {index}', description='', start_date=start_date, due_date=due_date,
+                    status=rng.choice(['waiting', 'in_progress', 'completed']), created_by=manager,
+                    latitude=round(rng.uniform(MIN_LAT, MAX_LAT), 6),
+                    longitude=round(rng.uniform(MIN_LNG, MAX_LNG), 6)
+                ))
+                if len(batch) == 10000:
+                    Task.objects.bulk_create(batch)
+                    batch = []
+            Task.objects.bulk_create(batch)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE tasks_task')
+
+            timings = []
+            found = 0
+            for _ in range(options['queries']):
+                lat, lng = rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG)
+                start = time.perf_counter()
+                found += len(list(nearby_tasks(Task.objects.all(), lat, lng, options['radius'])[:100].values('id')))
+                timings.append((time.perf_counter() - start) * 1000)
+
+            transaction.set_rollback(True)
+
+        timings.sort()
+        self.stdout.write(
+            f"{len(timings)} queries of {options['radius']}km over {options['tasks']} tasks "
+            f"({found / len(timings):.1f} results on average): "
+            f"p50 {statistics.median(timings):.1f}ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f}ms, max {timings[-1]:.1f}ms"
+        )
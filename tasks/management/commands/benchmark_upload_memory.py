@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.core.management.base import BaseCommand
+
+from tasks.documents import inspect_file
+from tasks.uploads import HashingUploadHandler
+
+BOUNDARY = 'BenchmarkBoundary'
+
+
+class BufferedUploadHandler(MemoryFileUploadHandler):
+    """Previous configuration: files up to 50MB are kept in memory"""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.activated = content_length <= 52428800
+
+
+HANDLERS = {
+    'buffered': BufferedUploadHandler,
+    'streaming': HashingUploadHandler,
+}
+
+
+def _write_request_body(path, size):
+    """Writes a multipart body with one file of the given size, returns the body length"""
+    with open(path, 'wb') as body:
+        body.write(
+            f'--{BOUNDARY}\r\n'
+            f'Content-Disposition: form-data; name="files"; filename="{os.path.basename(path)}.mp4"\r\n'
+            'Content-Type: video/mp4\r\n\r\n'.encode()
+        )
+        remaining = size
+        while remaining:
+            chunk = os.urandom(min(remaining, 1048576))
+            body.write(chunk)
+            remaining -= len(chunk)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    return os.path.getsize(path)
+
+
+def _handle_upload(path, length, handler_class):
+    with open(path, 'rb') as body:
+        request = WSGIRequest({
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/api/tasks/',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': body,
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+            'CONTENT_LENGTH': str(length),
+        })
+        request.upload_handlers = [handler_class(request)]
+        uploaded_file = request.FILES['files']
+        # Same metadata pass as save_task_documents
+        inspect_file(uploaded_file)
+        uploaded_file.close()
+
+
+class Command(BaseCommand):
+    help = 'Measures Python memory of concurrent multipart uploads with the buffered and streaming handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=8, help='Concurrent uploads')
+        parser.add_argument('--size-mb', type=int, default=20, help='File size of each upload in MB')
+        parser.add_argument('--handler', choices=['buffered', 'streaming', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        count = options['uploads']
+        handlers = list(HANDLERS) if options['handler'] == 'both' else [options['handler']]
+
+        directory = tempfile.mkdtemp(prefix='upload-benchmark-')
+        try:
+            bodies = []
+            for index in range(count):
+                path = os.path.join(directory, f'upload-{index}')
+                bodies.append((path, _write_request_body(path, options['size_mb'] * 1048576)))
+
+            for name in handlers:
+                tracemalloc.start()
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=count) as executor:
+                    list(executor.map(lambda body: _handle_upload(*body, HANDLERS[name]), bodies))
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                self.stdout.write(
+                    f"{name:>9}: {count} x {options['size_mb']}MB uploads, "
+                    f"peak memory {peak / 1048576:.1f}MB, {elapsed:.2f}s"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,64 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from tasks.models import User
+from tasks.views import search_users
+
+FIRST_NAMES = ['Ahmet', 'Mehmet', 'Ayşe', 'Fatma', 'Mustafa', 'Emine', 'Ali', 'Zeynep', 'Hüseyin', 'Elif']
+LAST_NAMES = ['Yılmaz', 'Kaya', 'Demir', 'Şahin', 'Çelik', 'Yıldız', 'Aydın', 'Öztürk', 'Arslan', 'Doğan']
+
+
+class Command(BaseCommand):
+    help = 'Measures /api/users/search/ query latency on generated users (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help='Generated users')
+        parser.add_argument('--queries', type=int, default=200, help='Searches to run')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+
+        with transaction.atomic():
+            self.stdout.write(f"Creating {options['users']} users...")
+            users = []
+            for index in range(options['users']):
+                first_name = rng.choice(FIRST_NAMES)
+                last_name = rng.choice(LAST_NAMES)
+                suffix = ''.join(rng.choices(string.ascii_lowercase, k=6))
+                email = f'{first_name.lower()}.{suffix}{index}@example.com'
+                users.append(User(
+                    username=email, email=email, first_name=first_name, last_name=last_name,
+                    phone=f'05{rng.randrange(10**8, 10**9)}', role='worker', password='!'
+                ))
+            User.objects.bulk_create(users, batch_size=5000)
+            if connection.vendor == 'postgresql':
+                # Fresh statistics, otherwise the planner assumes an empty table and skips the indexes
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE tasks_user')
+
+            terms = [rng.choice([
+                rng.choice(FIRST_NAMES)[:rng.randint(2, 5)],
+                f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[:3]}',
+                users[rng.randrange(len(users))].email[:8],
+                users[rng.randrange(len(users))].phone[-5:],
+            ]) for _ in range(options['queries'])]
+
+            timings = []
+            for term in terms:
+                start = time.perf_counter()
+                list(search_users(term, role='worker', limit=20))
+                timings.append((time.perf_counter() - start) * 1000)
+
+            transaction.set_rollback(True)
+
+        timings.sort()
+        self.stdout.write(
+            f"{len(timings)} searches over {options['users']} users: "
+            f"p50 {statistics.median(timings):.1f}ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f}ms, max {timings[-1]:.1f}ms"
+        )
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from tasks.documents import delete_storage_objects, referenced_names
+from tasks.models import UploadSession
+from tasks.storage import iter_stored_objects
+
+
+class Command(BaseCommand):
+    help = 'Reports (and optionally deletes) stored document files that no database row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='task_documents/', help='Storage prefix to scan')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Objects listed and checked per page')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Objects newer than this are skipped (uploads in progress)')
+        parser.add_argument('--delete', action='store_true', help='Delete the orphaned objects')
+        parser.add_argument('--dry-run', action='store_true', help='Only report, even with --delete')
+
+    def handle(self, *args, **options):
+        delete = options['delete'] and not options['dry_run']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+
+        scanned = orphaned = orphaned_bytes = 0
+        for page in iter_stored_objects(options['prefix'], page_size=options['batch_size']):
+            scanned += len(page)
+            candidates = {name: size for name, size, modified in page if modified < cutoff}
+            if not candidates:
+                continue
+
+            # One lookup per page for documents, blobs and unfinished resumable uploads
+            referenced = referenced_names(list(candidates))
+            upload_keys = {name[:-len('.part')] if name.endswith('.part') else name for name in candidates}
+            for key in UploadSession.objects.filter(key__in=upload_keys).values_list('key', flat=True):
+                referenced.update((key, f'{key}.part'))
+
+            orphans = sorted(name for name in candidates if name not in referenced)
+            for name in orphans:
+                self.stdout.write(f"{'Deleting' if delete else 'Orphaned'}: {name} ({filesizeformat(candidates[name])})")
+            orphaned += len(orphans)
+            orphaned_bytes += sum(candidates[name] for name in orphans)
+
+            if delete and orphans:
+                # References are checked again right before deleting
+                delete_storage_objects(orphans)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned: {scanned}, orphaned: {orphaned} ({filesizeformat(orphaned_bytes)})"
+            + ('' if delete else ', nothing deleted')
+        ))
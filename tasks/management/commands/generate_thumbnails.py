@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from tasks.documents import generate_thumbnail
+from tasks.images import IMAGE_EXTENSIONS
+from tasks.models import TaskDocument
+
+
+def _generate(document, force=False):
+    try:
+        return generate_thumbnail(document, force=force), None
+    except Exception as e:
+        return False, e
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Generates missing thumbnails for existing image documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Documents loaded per query')
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_PROCESSING_WORKERS,
+                            help='Documents processed in parallel')
+        parser.add_argument('--force', action='store_true', help='Regenerate existing thumbnails too')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Only image files, filtered in the database
+        queryset = TaskDocument.objects.filter(
+            reduce(or_, [Q(file__iendswith=extension) for extension in IMAGE_EXTENSIONS])
+        ).order_by('id')
+        if not options['force']:
+            queryset = queryset.filter(thumbnail='')
+
+        created = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                # Keyset pagination, so processed documents are not loaded again
+                batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                for document, (success, error) in zip(batch, executor.map(partial(_generate, force=options['force']), batch)):
+                    if error is not None:
+                        failed += 1
+                        self.stderr.write(f"Document {document.id}: {error}")
+                    elif success:
+                        created += 1
+
+                self.stdout.write(f"Processed documents up to id {last_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"Thumbnails created: {created}, failed: {failed}"))
@@ -0,0 +1,43 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.locations import create_partitions, drop_expired_pings, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Creates the coming daily location partitions and drops expired ones (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.LOCATION_RETENTION_DAYS,
+                            help='Keep pings of this many days')
+        parser.add_argument('--days-ahead', type=int, default=settings.LOCATION_PARTITION_DAYS_AHEAD,
+                            help='Partitions created in advance')
+        parser.add_argument('--loop', action='store_true', help='Keep running and repeat the maintenance')
+        parser.add_argument('--interval', type=float, default=3600, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            self.maintain(options['days'], options['days_ahead'])
+
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def maintain(self, days, days_ahead):
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+
+        if is_partitioned():
+            # Yesterday too, late pings of the previous day still arrive
+            create_partitions(today - datetime.timedelta(days=1), days_ahead + 2)
+            self.stdout.write(f"Partitions ensured until {today + datetime.timedelta(days=days_ahead)}")
+
+        result = drop_expired_pings(today - datetime.timedelta(days=days))
+        if is_partitioned():
+            self.stdout.write(self.style.SUCCESS(f"Partitions dropped: {', '.join(result) or 'none'}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Location pings deleted: {result}"))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from tasks.documents import DOCUMENT_COUNT_FIELDS
+from tasks.models import Task, TaskDocument
+
+
+class Command(BaseCommand):
+    help = 'Recounts the starting/ending document counters of tasks and fixes the ones that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tasks checked per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drifted tasks')
+
+    def handle(self, *args, **options):
+        fields = list(DOCUMENT_COUNT_FIELDS.values())
+        checked = fixed = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                # Locked, so documents added meanwhile cannot be counted twice or lost
+                tasks = list(
+                    Task.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                    .only('id', *fields)[:options['batch_size']]
+                )
+                if not tasks:
+                    break
+                last_id = tasks[-1].id
+
+                actual = {}
+                for row in (TaskDocument.objects.filter(task__in=tasks).order_by()
+                            .values('task_id', 'document_type').annotate(count=Count('id'))):
+                    actual[(row['task_id'], row['document_type'])] = row['count']
+
+                drifted = []
+                for task in tasks:
+                    changed = False
+                    for document_type, field in DOCUMENT_COUNT_FIELDS.items():
+                        count = actual.get((task.id, document_type), 0)
+                        if getattr(task, field) != count:
+                            self.stdout.write(f"Task {task.id} {field}: {getattr(task, field)} -> {count}")
+                            setattr(task, field, count)
+                            changed = True
+                    if changed:
+                        drifted.append(task)
+
+                if drifted and not options['dry_run']:
+                    Task.objects.bulk_update(drifted, fields)
+                checked += len(tasks)
+                fixed += len(drifted)
+
+        action = 'to fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f"Tasks checked: {checked}, {action}: {fixed}"))
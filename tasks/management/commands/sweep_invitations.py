@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from tasks.models import InvitationCode
+
+
+class Command(BaseCommand):
+    help = 'Deletes unused invitation codes that expired or were cancelled long ago (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.INVITATION_RETENTION_DAYS,
+                            help='Keep codes that expired less than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the codes')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Used codes are kept, they record how users registered
+        queryset = InvitationCode.objects.filter(is_used=False).filter(
+            Q(expires_at__lt=cutoff) | Q(is_cancelled=True, created_at__lt=cutoff)
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"Invitation codes to delete: {queryset.count()}")
+            return
+
+        deleted = 0
+        while True:
+            # Small batches keep locks and transactions short
+            ids = list(queryset.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += InvitationCode.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Invitation codes deleted: {deleted}"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskdocument',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=500, upload_to='', verbose_name='Thumbnail'),
+        ),
+        migrations.AlterField(
+            model_name='taskdocument',
+            name='file',
+            field=models.FileField(max_length=500, upload_to='task_documents/', verbose_name='File'),
+        ),
+    ]
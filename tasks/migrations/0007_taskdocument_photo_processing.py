@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_taskdocument_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskdocument',
+            name='bytes_saved',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Bytes Saved'),
+        ),
+        migrations.AddField(
+            model_name='taskdocument',
+            name='original_file',
+            field=models.FileField(blank=True, max_length=500, upload_to='', verbose_name='Original File'),
+        ),
+        migrations.AddField(
+            model_name='taskdocument',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Processed At'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_documentblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskdocument',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='taskdocument',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Content Type'),
+        ),
+        migrations.AddField(
+            model_name='taskdocument',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Height'),
+        ),
+        migrations.AddField(
+            model_name='taskdocument',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Size'),
+        ),
+        migrations.AddField(
+            model_name='taskdocument',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Width'),
+        ),
+        migrations.AddIndex(
+            model_name='taskdocument',
+            index=models.Index(fields=['content_type'], name='taskdocument_content_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskdocument',
+            index=models.Index(fields=['size'], name='taskdocument_size_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invitationcode',
+            index=models.Index(fields=['-created_at', '-id'], name='invitation_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitationcode',
+            index=models.Index(fields=['is_used', 'is_cancelled', 'expires_at'], name='invitation_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitationcode',
+            index=models.Index(fields=['email', 'expires_at'], name='invitation_email_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:33
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# On PostgreSQL the table is created partitioned by day of recorded_at. The
+# partition key has to be part of the primary key, and identity columns are
+# not supported on partitioned tables before PostgreSQL 17, so the id comes
+# from a sequence owned by the column. The model is only added to the
+# migration state, this SQL is the one statement creating the table there
+# (other databases get the table from the model).
+PARTITIONED_TABLE_SQL = """
+CREATE SEQUENCE IF NOT EXISTS tasks_locationping_id_seq;
+CREATE TABLE tasks_locationping (
+    id bigint NOT NULL DEFAULT nextval('tasks_locationping_id_seq'),
+    recorded_at timestamp with time zone NOT NULL,
+    received_at timestamp with time zone NOT NULL,
+    latitude double precision NOT NULL,
+    longitude double precision NOT NULL,
+    accuracy smallint NULL CHECK (accuracy >= 0),
+    worker_id bigint NOT NULL REFERENCES tasks_user (id) DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+ALTER SEQUENCE tasks_locationping_id_seq OWNED BY tasks_locationping.id;
+CREATE INDEX locationping_worker_idx ON tasks_locationping (worker_id, recorded_at);
+"""
+
+
+def create_location_pings(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(apps.get_model('tasks', 'LocationPing'))
+        return
+    schema_editor.execute(PARTITIONED_TABLE_SQL)
+    # Yesterday to a week ahead, maintain_location_partitions keeps it going
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    for offset in range(-1, 8):
+        day = today + datetime.timedelta(days=offset)
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS tasks_locationping_p{day:%Y%m%d} PARTITION OF tasks_locationping "
+            f"FOR VALUES FROM ('{day:%Y-%m-%d} 00:00:00+00') TO ('{day + datetime.timedelta(days=1):%Y-%m-%d} 00:00:00+00')"
+        )
+
+
+def drop_location_pings(apps, schema_editor):
+    # Partitions and the owned sequence are dropped with the table
+    schema_editor.delete_model(apps.get_model('tasks', 'LocationPing'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_geocodecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerLocation',
+            fields=[
+                ('worker', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='location', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Worker')),
+                ('latitude', models.FloatField(verbose_name='Latitude')),
+                ('longitude', models.FloatField(verbose_name='Longitude')),
+                ('accuracy', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Accuracy (m)')),
+                ('recorded_at', models.DateTimeField(verbose_name='Recorded At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Worker Location',
+                'verbose_name_plural': 'Worker Locations',
+            },
+        ),
+        # The table is created by create_location_pings, partitioned on PostgreSQL
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='LocationPing',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recorded_at', models.DateTimeField(verbose_name='Recorded At')),
+                        ('received_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Received At')),
+                        ('latitude', models.FloatField(verbose_name='Latitude')),
+                        ('longitude', models.FloatField(verbose_name='Longitude')),
+                        ('accuracy', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Accuracy (m)')),
+                        ('worker', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='location_pings', to=settings.AUTH_USER_MODEL, verbose_name='Worker')),
+                    ],
+                    options={
+                        'verbose_name': 'Location Ping',
+                        'verbose_name_plural': 'Location Pings',
+                        'indexes': [models.Index(fields=['worker', 'recorded_at'], name='locationping_worker_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_location_pings, drop_location_pings),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_documents(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    TaskDocument = apps.get_model('tasks', 'TaskDocument')
+
+    def counted(document_type):
+        return Coalesce(Subquery(
+            TaskDocument.objects.filter(task=OuterRef('pk'), document_type=document_type)
+            .order_by().values('task').annotate(count=Count('id')).values('count')
+        ), 0)
+
+    Task.objects.update(starting_document_count=counted('beginning'), ending_document_count=counted('ending'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_location_pings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='ending_document_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Ending Documents'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='starting_document_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Starting Documents'),
+        ),
+        migrations.RunPython(count_documents, migrations.RunPython.noop),
+    ]
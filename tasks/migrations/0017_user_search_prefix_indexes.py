@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Search terms shorter than three characters are istartswith lookups, which
+# trigram indexes cannot answer. B-tree indexes with text_pattern_ops on the
+# same UPPER("column"::text) expression serve these LIKE 'ab%' prefixes.
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS user_{field}_prefix_idx '
+            f'ON tasks_user (UPPER({field}::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS user_{field}_prefix_idx')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0016_task_document_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
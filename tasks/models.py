@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
@@ -12,6 +14,8 @@ class User(AbstractUser):
     email = models.EmailField(_('Email Address'), unique=True)
     role = models.CharField(_('Role'), max_length=15, choices=ROLE_CHOICES)
     phone = models.CharField(_('Phone'), max_length=15)
+    # Part of every issued token, incremented to revoke them
+    token_version = models.PositiveIntegerField(_('Token Version'), default=0)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -20,6 +24,10 @@ class User(AbstractUser):
         verbose_name = _('User')
         verbose_name_plural = _('Users')
 
+    def revoke_tokens(self):
+        """Invalidates every token issued to the user, the caller saves the user"""
+        self.token_version += 1
+
 class Task(models.Model):
     STATUS_CHOICES = (
         ('waiting', 'Waiting'),
@@ -47,11 +55,18 @@ class Task(models.Model):
         related_name='assigned_tasks',
         verbose_name=_('Assigned Workers')
     )
+    # Maintained with F() updates when documents are added or deleted (tasks/documents.py)
+    starting_document_count = models.IntegerField(_('Starting Documents'), default=0, editable=False)
+    ending_document_count = models.IntegerField(_('Ending Documents'), default=0, editable=False)
 
     class Meta:
         verbose_name = _('Work')
         verbose_name_plural = _('Work')
         ordering = ['-created_at']
+        indexes = [
+            # Bounding box of nearby queries (tasks/geo.py)
+            models.Index(fields=['latitude', 'longitude'], name='task_location_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -75,7 +90,17 @@ class TaskDocument(models.Model):
         verbose_name=_('Work')
     )
     document_type = models.CharField(_('Document Type'), max_length=20, choices=DOCUMENT_TYPES)
-    file = models.FileField(_('File'), upload_to='task_documents/')
+    file = models.FileField(_('File'), upload_to='task_documents/', max_length=500)
+    thumbnail = models.FileField(_('Thumbnail'), max_length=500, blank=True)
+    original_file = models.FileField(_('Original File'), max_length=500, blank=True)
+    bytes_saved = models.BigIntegerField(_('Bytes Saved'), null=True, blank=True)
+    processed_at = models.DateTimeField(_('Processed At'), null=True, blank=True)
+    # Metadata read from the upload stream, so nothing has to ask the storage
+    size = models.BigIntegerField(_('Size'), null=True, blank=True)
+    content_type = models.CharField(_('Content Type'), max_length=100, blank=True)
+    width = models.PositiveIntegerField(_('Width'), null=True, blank=True)
+    height = models.PositiveIntegerField(_('Height'), null=True, blank=True)
+    checksum = models.CharField(_('SHA-256'), max_length=64, blank=True)
     uploaded_at = models.DateTimeField(_('Uploaded At'), auto_now_add=True)
     uploaded_by = models.ForeignKey(
         'User',
@@ -88,16 +113,170 @@ class TaskDocument(models.Model):
         verbose_name = _('Work Document')
         verbose_name_plural = _('Work Documents')
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['content_type'], name='taskdocument_content_type_idx'),
+            models.Index(fields=['size'], name='taskdocument_size_idx'),
+        ]
 
     def __str__(self):
         return f"{self.task.title} - {self.get_document_type_display()}"
 
-    def delete(self, *args, **kwargs):
-        # First delete file from storage
-        if self.file:
-            self.file.delete(save=False)
-        # Then delete database record
-        super().delete(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        from .documents import upload_blobs, register_blobs, apply_blob_metadata, adjust_document_counts
+
+        with transaction.atomic():
+            # New uploads are stored content addressed, identical files share one object
+            if self.file and not self.file._committed:
+                blob, error = upload_blobs([self.file.file])[0]
+                if error:
+                    raise error
+                self.file.name = register_blobs([blob], [self.file.file])[blob.checksum]
+                self.file._committed = True
+                apply_blob_metadata(self, blob)
+
+            # Moving a document to another task or type moves it between counters
+            previous = None
+            if not self._state.adding and self.pk:
+                previous = TaskDocument.objects.filter(pk=self.pk).values_list('task_id', 'document_type').first()
+            super().save(*args, **kwargs)
+            if previous and previous != (self.task_id, self.document_type):
+                adjust_document_counts({previous: -1, (self.task_id, self.document_type): 1})
+
+class DocumentBlob(models.Model):
+    """
+    Content addressed storage object shared by identical task documents.
+    The object is removed from storage when its last reference goes away.
+    """
+    checksum = models.CharField(_('SHA-256'), max_length=64, unique=True)
+    file = models.FileField(_('File'), max_length=500, unique=True)
+    size = models.BigIntegerField(_('Size'))
+    ref_count = models.IntegerField(_('Reference Count'), default=0)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Document Blob')
+        verbose_name_plural = _('Document Blobs')
+
+    def __str__(self):
+        return f"{self.checksum} ({self.ref_count})"
+
+class UploadSession(models.Model):
+    """
+    State of a resumable (chunked) document upload.
+    Kept in the database so any web node can accept the next chunk.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name=_('Work')
+    )
+    document_type = models.CharField(_('Document Type'), max_length=20, choices=TaskDocument.DOCUMENT_TYPES)
+    uploaded_by = models.ForeignKey(
+        'User',
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name=_('Uploaded By')
+    )
+    filename = models.CharField(_('File Name'), max_length=255)
+    content_type = models.CharField(_('Content Type'), max_length=100, blank=True)
+    key = models.CharField(_('Storage Key'), max_length=500)
+    length = models.BigIntegerField(_('Length'))
+    offset = models.BigIntegerField(_('Offset'), default=0)
+    storage_upload_id = models.CharField(_('Storage Upload ID'), max_length=255, blank=True)
+    parts = models.JSONField(_('Uploaded Parts'), default=list, blank=True)
+    document = models.OneToOneField(
+        TaskDocument,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload_session',
+        verbose_name=_('Document')
+    )
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Upload Session')
+        verbose_name_plural = _('Upload Sessions')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.length})"
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.length
+
+class GeocodeCache(models.Model):
+    """
+    Geocoding results by normalized address, so an address is sent to the
+    provider only once. Empty coordinates mean the provider found nothing.
+    """
+    address = models.CharField(_('Normalized Address'), max_length=500, unique=True)
+    latitude = models.DecimalField(_('Latitude'), max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(_('Longitude'), max_digits=9, decimal_places=6, blank=True, null=True)
+    provider = models.CharField(_('Provider'), max_length=100)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Geocode Cache')
+        verbose_name_plural = _('Geocode Cache')
+
+    def __str__(self):
+        return self.address
+
+class LocationPing(models.Model):
+    """
+    GPS check-in sent by a worker's phone. Append only; on PostgreSQL the
+    table is partitioned by day of recorded_at (tasks/locations.py).
+    """
+    worker = models.ForeignKey(
+        'User',
+        on_delete=models.CASCADE,
+        related_name='location_pings',
+        verbose_name=_('Worker'),
+        db_index=False
+    )
+    recorded_at = models.DateTimeField(_('Recorded At'))
+    received_at = models.DateTimeField(_('Received At'), default=timezone.now)
+    # Doubles are enough for GPS precision and smaller than decimals
+    latitude = models.FloatField(_('Latitude'))
+    longitude = models.FloatField(_('Longitude'))
+    accuracy = models.PositiveSmallIntegerField(_('Accuracy (m)'), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('Location Ping')
+        verbose_name_plural = _('Location Pings')
+        indexes = [
+            models.Index(fields=['worker', 'recorded_at'], name='locationping_worker_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.worker_id} @ {self.recorded_at}"
+
+class WorkerLocation(models.Model):
+    """Latest known position of each worker, one row per worker"""
+    worker = models.OneToOneField(
+        'User',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='location',
+        verbose_name=_('Worker')
+    )
+    latitude = models.FloatField(_('Latitude'))
+    longitude = models.FloatField(_('Longitude'))
+    accuracy = models.PositiveSmallIntegerField(_('Accuracy (m)'), blank=True, null=True)
+    recorded_at = models.DateTimeField(_('Recorded At'))
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Worker Location')
+        verbose_name_plural = _('Worker Locations')
+
+    def __str__(self):
+        return f"{self.worker_id} @ {self.recorded_at}"
 
 class InvitationCode(models.Model):
     code = models.CharField(max_length=6, unique=True)
@@ -116,4 +295,12 @@ class InvitationCode(models.Model):
         return not self.is_used and not self.is_cancelled and self.expires_at > timezone.now()
 
     class Meta:
-        ordering = ['-created_at'] 
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Cursor pagination of the invitation list
+            models.Index(fields=['-created_at', '-id'], name='invitation_created_idx'),
+            # State filters and the expiry sweep
+            models.Index(fields=['is_used', 'is_cancelled', 'expires_at'], name='invitation_state_idx'),
+            # Active invitation checks by email
+            models.Index(fields=['email', 'expires_at'], name='invitation_email_idx'),
+        ]
\ No newline at end of file
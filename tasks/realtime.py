@@ -0,0 +1,235 @@
+"""
+Real-time task events streamed to clients with Server-Sent Events.
+
+Task saves, document uploads and assignment changes are published to a
+pluggable broker. The SSE endpoint (served through the ASGI entry point)
+subscribes authenticated users and forwards only the events of the tasks
+they can see.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from .authentication import CachedJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """Queue of events for a single connected client."""
+
+    def __init__(self, broker, loop, maxsize=100):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event):
+        # Publishers run in worker threads, so hand the event over to the loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop is already closed, client is gone
+            self.close()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Real-time subscriber is too slow, event dropped.")
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Delivers events to subscribers of the current process.
+    Used in tests and single-node deployments.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        self.dispatch(event)
+
+    def dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def subscribe(self):
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Fans events out between processes with PostgreSQL LISTEN/NOTIFY.
+
+    Web workers publish with pg_notify, the ASGI process runs one listener
+    thread that forwards notifications to its local subscribers.
+    """
+
+    channel = 'task_events'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, event):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, json.dumps(event)])
+
+    def subscribe(self):
+        self._start_listener()
+        return super().subscribe()
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='task-events-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        import psycopg2
+
+        while True:
+            try:
+                params = connection.get_connection_params()
+                conn = psycopg2.connect(**params)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.dispatch(json.loads(notify.payload))
+            except Exception as e:
+                logger.error(f"Real-time listener connection lost: {e}")
+                time.sleep(1)
+
+
+def get_broker():
+    """Returns the configured broker (created once per process)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'REALTIME_BACKEND', 'tasks.realtime.InProcessBroker')
+                _broker = import_string(backend)()
+    return _broker
+
+
+def publish_task_event(task, event_type, audience=None, **data):
+    """
+    Publishes an event about a task after the current transaction commits.
+    Audience is the list of worker IDs that can see the task, site managers see every event.
+    Without one the assigned workers are read after commit, so saves do not query them.
+    """
+    task_id = task.id
+
+    def _publish():
+        try:
+            workers = audience
+            if workers is None:
+                workers = task.assigned_workers.values_list('id', flat=True)
+            get_broker().publish({
+                'type': event_type,
+                'task_id': task_id,
+                'audience': sorted(set(workers)),
+                'data': data,
+            })
+        except Exception as e:
+            logger.error(f"Real-time event could not be published: {e}")
+
+    transaction.on_commit(_publish)
+
+
+def can_receive(user, event):
+    """Checks if the user can see the task the event belongs to"""
+    return user.role == 'site_manager' or user.id in event.get('audience', [])
+
+
+def format_event(event):
+    payload = {'task_id': event['task_id'], **event.get('data', {})}
+    return f"event: {event['type']}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _authenticate(request):
+    """Authenticates with the Authorization header or ?token= (EventSource cannot send headers)"""
+    auth = CachedJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        validated_token = auth.get_validated_token(raw_token)
+        return auth.get_user(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def _event_stream(subscription, user):
+    keepalive = getattr(settings, 'REALTIME_KEEPALIVE_SECONDS', 15)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await subscription.get(timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if can_receive(user, event):
+                yield format_event(event)
+    finally:
+        subscription.close()
+
+
+async def task_events(request):
+    """
+    Server-Sent Events stream of task changes visible to the user.
+    URL: /api/tasks/events/
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided or are invalid.'},
+            status=401
+        )
+
+    subscription = get_broker().subscribe()
+    response = StreamingHttpResponse(
+        _event_stream(subscription, user),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
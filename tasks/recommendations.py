@@ -0,0 +1,100 @@
+"""
+Worker suggestions for a task.
+
+Every active worker is scored in one NumPy pass from two queries: open and
+overlapping task counts per worker (one aggregate query) and the coordinates
+of their open tasks (one query). Lower workload, fewer tasks overlapping the
+task's start-due window and a shorter distance from the worker's other tasks
+give a higher score.
+"""
+import numpy as np
+from django.db.models import Count, Q
+
+from .models import Task, User
+from .routing import distances_from
+
+# Relative weight of each factor in the score
+WORKLOAD_WEIGHT = 0.35
+OVERLAP_WEIGHT = 0.4
+DISTANCE_WEIGHT = 0.25
+# A worker this far away from the task gets half of the distance penalty
+DISTANCE_SCALE_KM = 10
+
+
+def worker_features(task):
+    """Returns (workers, open_counts, overlap_counts, distances) as arrays aligned with the workers list"""
+    open_tasks = Q(assigned_tasks__status__in=['waiting', 'in_progress']) & ~Q(assigned_tasks__pk=task.pk)
+    workers = list(
+        User.objects.filter(role='worker', is_active=True)
+        .annotate(
+            open_tasks=Count('assigned_tasks', filter=open_tasks),
+            overlapping_tasks=Count('assigned_tasks', filter=open_tasks & Q(
+                assigned_tasks__start_date__lt=task.due_date, assigned_tasks__due_date__gt=task.start_date
+            ))
+        )
+        .order_by('id')
+        .only('id', 'first_name', 'last_name', 'email')
+    )
+    ids = np.array([worker.id for worker in workers], dtype=np.int64)
+    open_counts = np.array([worker.open_tasks for worker in workers], dtype=float)
+    overlap_counts = np.array([worker.overlapping_tasks for worker in workers], dtype=float)
+
+    # Distance from the task to the closest open task of each worker, NaN if unknown
+    distances = np.full(len(workers), np.nan)
+    if task.latitude is not None and task.longitude is not None and workers:
+        rows = list(
+            Task.assigned_workers.through.objects
+            .filter(task__status__in=['waiting', 'in_progress'], task__latitude__isnull=False,
+                    task__longitude__isnull=False, user__role='worker', user__is_active=True)
+            .exclude(task_id=task.pk)
+            .values_list('user_id', 'task__latitude', 'task__longitude')
+        )
+        if rows:
+            user_ids = np.array([row[0] for row in rows], dtype=np.int64)
+            from_task = distances_from(
+                (float(task.latitude), float(task.longitude)),
+                [(float(row[1]), float(row[2])) for row in rows]
+            )
+
+            positions = np.searchsorted(ids, user_ids)
+            known = (positions < len(ids)) & (ids[np.minimum(positions, len(ids) - 1)] == user_ids)
+            closest = np.full(len(workers), np.inf)
+            np.minimum.at(closest, positions[known], from_task[known])
+            distances = np.where(np.isinf(closest), np.nan, closest)
+
+    return workers, open_counts, overlap_counts, distances
+
+
+def score_workers(open_counts, overlap_counts, distances):
+    """Scores between 0 and 1, higher is a better fit"""
+    workload = open_counts / max(open_counts.max(initial=0), 1)
+    overlap = overlap_counts / max(overlap_counts.max(initial=0), 1)
+    # Workers without located tasks get a neutral distance penalty
+    distance = np.where(np.isnan(distances), 0.5, distances / (np.nan_to_num(distances) + DISTANCE_SCALE_KM))
+
+    penalty = WORKLOAD_WEIGHT * workload + OVERLAP_WEIGHT * overlap + DISTANCE_WEIGHT * distance
+    return 1 - penalty / (WORKLOAD_WEIGHT + OVERLAP_WEIGHT + DISTANCE_WEIGHT)
+
+
+def suggest_workers(task, limit=10):
+    """Best scoring workers for the task as dicts, best first"""
+    workers, open_counts, overlap_counts, distances = worker_features(task)
+    if not workers:
+        return []
+
+    scores = score_workers(open_counts, overlap_counts, distances)
+    assigned = set(task.assigned_workers.values_list('id', flat=True))
+
+    # Stable sort keeps the lower id first on equal scores
+    best = np.argsort(-scores, kind='stable')[:limit]
+    return [{
+        'id': workers[index].id,
+        'first_name': workers[index].first_name,
+        'last_name': workers[index].last_name,
+        'email': workers[index].email,
+        'score': round(float(scores[index]), 4),
+        'open_tasks': int(open_counts[index]),
+        'overlapping_tasks': int(overlap_counts[index]),
+        'distance_km': None if np.isnan(distances[index]) else round(float(distances[index]), 3),
+        'is_assigned': workers[index].id in assigned
+    } for index in best]
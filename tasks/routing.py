@@ -0,0 +1,140 @@
+"""
+Visiting order of a worker's tasks for a day.
+
+The distance matrix of all stops is computed in one NumPy pass, the order is
+built with nearest neighbour from every possible start and then improved
+with 2-opt until no move helps or ROUTE_TIME_BUDGET runs out. Routes are
+cached per worker under a version that is incremented whenever the worker's
+assignments or the assigned tasks change. The version lives in the shared
+cache (CACHE_URL), ROUTE_CACHE_TIMEOUT bounds staleness without one.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import EARTH_RADIUS_KM
+
+
+def distance_matrix(points):
+    """Haversine distances in km between every pair of (lat, lng) points"""
+    points = np.radians(np.asarray(points, dtype=float))
+    lat = points[:, 0]
+    lng = points[:, 1]
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distances_from(origin, points):
+    """Haversine distances in km from one (lat, lng) point to each of points"""
+    lat0, lng0 = np.radians(np.asarray(origin, dtype=float))
+    points = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    lat = points[:, 0]
+    lng = points[:, 1]
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat) * np.sin((lng - lng0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def route_length(route, matrix):
+    return float(matrix[route[:-1], route[1:]].sum()) if len(route) > 1 else 0.0
+
+
+def nearest_neighbour(matrix, start):
+    """Open path that always continues to the closest unvisited stop"""
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    route = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        distances = np.where(visited, np.inf, matrix[route[-1]])
+        route.append(int(distances.argmin()))
+        visited[route[-1]] = True
+    return np.array(route)
+
+
+def two_opt(route, matrix, deadline, fixed_start=False):
+    """
+    Reverses route segments while that shortens the (open) path. For each
+    segment start every possible end is evaluated at once.
+    """
+    route = route.copy()
+    n = len(route)
+    first = 1 if fixed_start else 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(first, n - 1):
+            ends = np.arange(i + 1, n)
+            b = route[i]
+            c = route[ends]
+            # Stop after the reversed segment, the path has no edge after its last stop
+            has_next = ends + 1 < n
+            e = route[np.minimum(ends + 1, n - 1)]
+
+            delta = np.where(has_next, matrix[b, e] - matrix[c, e], 0.0)
+            if i > 0:
+                a = route[i - 1]
+                delta += matrix[a, c] - matrix[a, b]
+
+            best = int(delta.argmin())
+            if delta[best] < -1e-9:
+                route[i:ends[best] + 1] = route[i:ends[best] + 1][::-1].copy()
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return route
+
+
+def plan_route(points, origin=None, time_budget=None):
+    """
+    Returns (order, legs) for a list of (lat, lng) stops: the indexes of the
+    stops in visiting order and the distance in km to each stop from the
+    previous one (from origin for the first stop, if given).
+    """
+    if not points:
+        return [], []
+    time_budget = settings.ROUTE_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.perf_counter() + time_budget
+
+    stops = [origin] + list(points) if origin else list(points)
+    matrix = distance_matrix(stops)
+
+    if origin:
+        route = two_opt(nearest_neighbour(matrix, 0), matrix, deadline, fixed_start=True)
+    else:
+        # Small days, so every start is tried and the shortest path is kept
+        candidates = [nearest_neighbour(matrix, start) for start in range(len(stops))]
+        route = min(candidates, key=lambda candidate: route_length(candidate, matrix))
+        route = two_opt(route, matrix, deadline)
+
+    legs = [0.0] + matrix[route[:-1], route[1:]].tolist()
+    if origin:
+        return [int(stop) - 1 for stop in route[1:]], legs[1:]
+    return [int(stop) for stop in route], legs
+
+
+def _version_key(worker_id):
+    return f'route_version:{worker_id}'
+
+
+def route_cache_key(worker_id, day, origin=None):
+    version = cache.get(_version_key(worker_id), 0)
+    # Origins are rounded to about a kilometre so nearby positions share the route,
+    # the view measures the first leg from the exact origin
+    origin_key = f'{origin[0]:.2f},{origin[1]:.2f}' if origin else '-'
+    return f'route:{worker_id}:{version}:{day.isoformat()}:{origin_key}'
+
+
+def invalidate_routes(worker_ids):
+    """Cached routes of these workers are recomputed on the next request"""
+    for worker_id in set(worker_ids):
+        key = _version_key(worker_id)
+        # Unlike incr, add creates the counter; it is never expired so versions are not reused
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
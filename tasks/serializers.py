@@ -1,6 +1,11 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import User, Task, TaskDocument, InvitationCode
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .models import User, Task, TaskDocument, InvitationCode, UploadSession
+from .authentication import add_user_claims
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
@@ -8,6 +13,11 @@ from django.core.validators import validate_email
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'email'
 
+    @classmethod
+    def get_token(cls, user):
+        # Role and token version are read by CachedJWTAuthentication
+        return add_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
@@ -50,9 +60,13 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
                 {'error': 'This account is not active.'}
             )
 
-        # Use email as username
-        attrs['username'] = email
-        return super().validate(attrs)
+        # Issue the tokens for the user found above. super().validate() would
+        # authenticate again: a second lookup and a second password hash.
+        self.user = user
+        refresh = self.get_token(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
@@ -136,10 +150,89 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 class TaskDocumentSerializer(serializers.ModelSerializer):
+    thumbnail_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
     class Meta:
         model = TaskDocument
-        fields = ('id', 'task', 'document_type', 'file', 'uploaded_at', 'uploaded_by')
-        read_only_fields = ('id', 'uploaded_at', 'uploaded_by')
+        fields = ('id', 'task', 'document_type', 'file', 'thumbnail_url', 'download_url', 'size', 'content_type',
+                  'width', 'height', 'checksum', 'uploaded_at', 'uploaded_by')
+        read_only_fields = ('id', 'size', 'content_type', 'width', 'height', 'checksum',
+                            'uploaded_at', 'uploaded_by')
+
+    def get_thumbnail_url(self, obj):
+        # Thumbnail is generated in the background, None until it is ready
+        if not obj.thumbnail:
+            return None
+        url = obj.thumbnail.url
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_download_url(self, obj):
+        # Protected endpoint, works for private storage objects
+        url = reverse('taskdocument-download', args=[obj.id])
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+class DirectUploadFileSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=200)
+    content_type = serializers.CharField(max_length=100, required=False, default='application/octet-stream')
+
+class DirectUploadRequestSerializer(serializers.Serializer):
+    document_type = serializers.ChoiceField(choices=TaskDocument.DOCUMENT_TYPES)
+    files = DirectUploadFileSerializer(many=True)
+
+    def validate_files(self, value):
+        max_files = getattr(settings, 'DIRECT_UPLOAD_MAX_FILES', 50)
+        if not value:
+            raise serializers.ValidationError('At least one file is required.')
+        if len(value) > max_files:
+            raise serializers.ValidationError(f'At most {max_files} files can be uploaded at once.')
+        return value
+
+class DirectUploadConfirmSerializer(serializers.Serializer):
+    document_type = serializers.ChoiceField(choices=TaskDocument.DOCUMENT_TYPES)
+    keys = serializers.ListField(child=serializers.CharField(max_length=500), allow_empty=False)
+
+class BulkInvitationSerializer(serializers.Serializer):
+    emails = serializers.ListField(
+        child=serializers.EmailField(),
+        allow_empty=False,
+        max_length=settings.INVITATION_BULK_MAX_EMAILS
+    )
+
+class LocationPointSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField()
+    accuracy = serializers.IntegerField(min_value=0, max_value=32767, required=False, allow_null=True)
+
+class LocationCheckinSerializer(serializers.Serializer):
+    points = LocationPointSerializer(many=True)
+
+    def validate_points(self, value):
+        max_points = getattr(settings, 'LOCATION_BATCH_MAX_POINTS', 500)
+        if not value:
+            raise serializers.ValidationError('At least one point is required.')
+        if len(value) > max_points:
+            raise serializers.ValidationError(f'At most {max_points} points can be sent at once.')
+        return value
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'task', 'document_type', 'filename', 'content_type', 'length', 'offset',
+                 'document', 'created_at')
+        read_only_fields = ('id', 'offset', 'document', 'created_at')
+
+    def validate_length(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Length must be greater than zero.')
+        return value
 
 class TaskSerializer(serializers.ModelSerializer):
     documents = TaskDocumentSerializer(many=True, read_only=True)
@@ -150,17 +243,28 @@ class TaskSerializer(serializers.ModelSerializer):
         model = Task
         fields = ('id', 'title', 'description', 'created_at', 'start_date', 'due_date', 
                  'status', 'created_by', 'assigned_workers', 'assigned_workers_details', 'documents',
-                 'address', 'latitude', 'longitude', 'google_maps_url')
-        read_only_fields = ('id', 'created_at', 'created_by')
+                 'address', 'latitude', 'longitude', 'google_maps_url',
+                 'starting_document_count', 'ending_document_count')
+        read_only_fields = ('id', 'created_at', 'created_by', 'starting_document_count', 'ending_document_count')
 
     def get_google_maps_url(self, obj):
         return obj.get_google_maps_url()
 
+    def is_list_view(self):
+        return bool(self.context.get('view')) and self.context['view'].action in ('list', 'nearby', 'route')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Lists use the document counters, the documents are only loaded for a single task
+        if self.is_list_view():
+            fields.pop('documents')
+        return fields
+
     def to_representation(self, instance):
         """Customize response"""
         data = super().to_representation(instance)
         # If in list view (multiple tasks are listed)
-        if self.context.get('view') and self.context['view'].action == 'list':
+        if self.is_list_view():
             # Return only basic information for each worker
             workers = []
             for worker in instance.assigned_workers.all():
@@ -2,7 +2,7 @@ from django.template.loader import render_to_string
 import firebase_admin
 from firebase_admin import credentials, messaging
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import get_connection, EmailMultiAlternatives
 
 _firebase_app = None
 
@@ -38,16 +38,23 @@ def send_push_notification(token, title, body, data=None):
     except Exception as e:
         return False, str(e)
 
-def send_invitation_email(email, code):
-    subject = 'WorkFlow - Davet Kodunuz'
-    html_message = render_to_string('invitation_email.html', {'code': code})
-    text_message = render_to_string('invitation_email.txt', {'code': code})
-    
-    send_mail(
-        subject=subject,
-        message=text_message,  # Plain text version
-        html_message=html_message,  # HTML version
+def invitation_message(email, code):
+    """Invitation email with its plain text and HTML versions"""
+    message = EmailMultiAlternatives(
+        subject='WorkFlow - Davet Kodunuz',
+        body=render_to_string('invitation_email.txt', {'code': code}),
         from_email=settings.EMAIL_HOST_USER,
-        recipient_list=[email],
-        fail_silently=False,
-    ) 
\ No newline at end of file
+        to=[email]
+    )
+    message.attach_alternative(render_to_string('invitation_email.html', {'code': code}), 'text/html')
+    return message
+
+
+def send_invitation_email(email, code):
+    invitation_message(email, code).send(fail_silently=False)
+
+
+def send_invitation_emails(invitations):
+    """Sends the emails of many invitations over one connection (one insert with the mail queue)"""
+    messages = [invitation_message(invitation.email, invitation.code) for invitation in invitations]
+    get_connection(fail_silently=False).send_messages(messages)
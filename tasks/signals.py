@@ -1,6 +1,12 @@
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from .models import Task, User
+from .models import Task, TaskDocument, User
+from .realtime import publish_task_event
+from .authentication import invalidate_cached_user
+from .documents import documents_added, document_deleted
+from .routing import invalidate_routes
+from .geocoding import geocode_task
+from .background import run_after_commit
 from notifications.models import DeviceToken
 from notifications.fcm import send_multicast_notification
 import logging
@@ -66,4 +72,83 @@ def send_task_assignment_notification(sender, instance, action, pk_set, **kwargs
                 logger.warning(f"İşçi {worker.username} için kayıtlı cihaz token'ı bulunamadı.")
     
     except Exception as e:
-        logger.error(f"İş atama bildirimi gönderilirken hata oluştu: {e}") 
\ No newline at end of file
+        logger.error(f"İş atama bildirimi gönderilirken hata oluştu: {e}") 
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, **kwargs):
+    """Publishes task creations and updates to the real-time channel."""
+    publish_task_event(instance, 'task.saved', created=created, status=instance.status)
+
+@receiver(post_save, sender=TaskDocument)
+def handle_document_uploaded(sender, instance, created, **kwargs):
+    """Publishes newly uploaded task documents and schedules their thumbnails."""
+    if not created:
+        return
+    documents_added(instance.task, instance.document_type, [instance])
+
+@receiver(post_delete, sender=TaskDocument)
+def release_document_files(sender, instance, **kwargs):
+    """
+    Releases the files of deleted documents, also when they are deleted by a cascade
+    (task or user deletes) where TaskDocument.delete is never called.
+    """
+    document_deleted(instance)
+
+@receiver(m2m_changed, sender=Task.assigned_workers.through)
+def publish_assignment_changed(sender, instance, action, pk_set, reverse=False, **kwargs):
+    """
+    Publishes assignment changes to the real-time channel.
+    Removed workers are included in the audience so their clients can drop the task.
+    """
+    if reverse or action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+
+    if action == 'pre_clear':
+        # Remember workers before they are removed
+        instance._cleared_worker_ids = list(instance.assigned_workers.values_list('id', flat=True))
+        return
+
+    changed_ids = list(pk_set or [])
+    if action == 'post_clear':
+        changed_ids = getattr(instance, '_cleared_worker_ids', [])
+
+    current_ids = list(instance.assigned_workers.values_list('id', flat=True))
+    publish_task_event(
+        instance,
+        'task.assignment_changed',
+        audience=current_ids + changed_ids,
+        action=action.split('_', 1)[1],
+        worker_ids=sorted(changed_ids)
+    )
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    """Authenticated requests load the changed user (role, is_active, token version) again."""
+    invalidate_cached_user(instance)
+
+@receiver(m2m_changed, sender=Task.assigned_workers.through)
+def drop_assignment_routes(sender, instance, action, pk_set, reverse=False, **kwargs):
+    """Routes of workers whose assignments change are planned again."""
+    if action == 'pre_clear':
+        if reverse:
+            invalidate_routes([instance.pk])
+        else:
+            invalidate_routes(instance.assigned_workers.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    invalidate_routes([instance.pk] if reverse else pk_set or [])
+
+@receiver(post_save, sender=Task)
+@receiver(pre_delete, sender=Task)
+def drop_task_routes(sender, instance, **kwargs):
+    """Coordinates, dates or status of the task may have changed, its workers' routes are planned again."""
+    if instance.pk and not kwargs.get('created'):
+        invalidate_routes(instance.assigned_workers.values_list('id', flat=True))
+
+@receiver(post_save, sender=Task)
+def geocode_task_address(sender, instance, **kwargs):
+    """Tasks with an address but without coordinates are geocoded in the background."""
+    if instance.address and (instance.latitude is None or instance.longitude is None):
+        run_after_commit(geocode_task, instance.pk)
@@ -0,0 +1,230 @@
+"""
+Object storage helpers for task documents.
+
+Direct (presigned) uploads only work with S3 compatible storages
+(production Hetzner bucket). Local FileSystemStorage does not support them.
+Resumable uploads work with both.
+"""
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
+
+DIRECT_UPLOAD_PREFIX = 'task_documents/uploads'
+
+
+def get_s3_client(storage=None):
+    """Returns the boto3 client of an S3 storage or None for other storages"""
+    storage = storage or default_storage
+    connection = getattr(storage, 'connection', None)
+    if connection is None or not hasattr(storage, 'bucket_name'):
+        return None
+    return connection.meta.client
+
+
+def supports_direct_upload(storage=None):
+    return get_s3_client(storage) is not None
+
+
+def direct_upload_key(task_id, filename):
+    """Generates a unique storage key inside the task's upload prefix"""
+    filename = get_valid_filename(os.path.basename(filename)) or 'file'
+    return f"{DIRECT_UPLOAD_PREFIX}/{task_id}/{uuid.uuid4().hex}/{filename}"
+
+
+def is_direct_upload_key(task_id, key):
+    """Checks that a key was generated for this task (clients cannot claim other objects)"""
+    prefix = f"{DIRECT_UPLOAD_PREFIX}/{task_id}/"
+    return key.startswith(prefix) and '..' not in key and key.count('/') == prefix.count('/') + 1
+
+
+def uploaded_keys(task_id, keys, storage=None):
+    """Returns the keys that were uploaded, with one listing of the task's upload prefix instead of a HEAD per key"""
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    wanted = {storage._normalize_name(key): key for key in keys}
+    found = set()
+    paginator = client.get_paginator('list_objects_v2')
+    prefix = storage._normalize_name(f"{DIRECT_UPLOAD_PREFIX}/{task_id}/")
+    for page in paginator.paginate(Bucket=storage.bucket_name, Prefix=prefix):
+        for item in page.get('Contents', []):
+            if item['Key'] in wanted:
+                found.add(wanted[item['Key']])
+    return found
+
+
+def generate_presigned_upload(key, content_type, storage=None):
+    """
+    Creates a presigned PUT URL for a key.
+    Returns the URL with the headers the client must send with the upload.
+    """
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    expires = getattr(settings, 'DIRECT_UPLOAD_EXPIRES', 900)
+
+    params = {
+        'Bucket': storage.bucket_name,
+        'Key': storage._normalize_name(key),
+        'ContentType': content_type,
+    }
+    headers = {'Content-Type': content_type}
+
+    acl = getattr(storage, 'default_acl', None)
+    if acl:
+        params['ACL'] = acl
+        headers['x-amz-acl'] = acl
+
+    url = client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires, HttpMethod='PUT')
+    return {
+        'key': key,
+        'url': url,
+        'method': 'PUT',
+        'headers': headers,
+        'expires_in': expires,
+    }
+
+
+# Resumable (chunked) uploads
+# S3 storages assemble chunks with a multipart upload, other storages
+# append to a partial file next to the final path (shared volume).
+
+def start_chunked_upload(key, content_type, storage=None):
+    """Starts a chunked upload, returns the storage upload id ('' for local storage)"""
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    if client is None:
+        path = storage.path(key) + '.part'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+        return ''
+
+    params = {
+        'Bucket': storage.bucket_name,
+        'Key': storage._normalize_name(key),
+        'ContentType': content_type or 'application/octet-stream',
+    }
+    acl = getattr(storage, 'default_acl', None)
+    if acl:
+        params['ACL'] = acl
+    return client.create_multipart_upload(**params)['UploadId']
+
+
+def write_chunk(session, chunk, storage=None):
+    """
+    Appends a chunk (file object) to the upload, the chunk is streamed to the storage.
+    Updates session.parts, caller saves the session.
+    """
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    if client is None:
+        with open(storage.path(session.key) + '.part', 'ab') as part:
+            shutil.copyfileobj(chunk, part)
+        return
+
+    part_number = len(session.parts) + 1
+    response = client.upload_part(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(session.key),
+        UploadId=session.storage_upload_id,
+        PartNumber=part_number,
+        Body=chunk
+    )
+    session.parts = session.parts + [{'PartNumber': part_number, 'ETag': response['ETag']}]
+
+
+def finish_chunked_upload(session, storage=None):
+    """Assembles the uploaded chunks into the final object"""
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    if client is None:
+        os.replace(storage.path(session.key) + '.part', storage.path(session.key))
+        return
+
+    client.complete_multipart_upload(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(session.key),
+        UploadId=session.storage_upload_id,
+        MultipartUpload={'Parts': session.parts}
+    )
+
+
+def abort_chunked_upload(session, storage=None):
+    """Discards the chunks of an unfinished upload"""
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    if client is None:
+        path = storage.path(session.key) + '.part'
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    client.abort_multipart_upload(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(session.key),
+        UploadId=session.storage_upload_id
+    )
+
+
+def iter_object_chunks(name, chunk_size=1048576, storage=None):
+    """
+    Yields the content of a stored object in chunks.
+    S3 objects are streamed from the response body, nothing is spooled to memory or disk.
+    """
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    if client is None:
+        with storage.open(name, 'rb') as file:
+            yield from file.chunks(chunk_size)
+        return
+
+    response = client.get_object(Bucket=storage.bucket_name, Key=storage._normalize_name(name))
+    body = response['Body']
+    try:
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
+
+
+def iter_stored_objects(prefix, page_size=1000, storage=None):
+    """
+    Lists stored objects below a prefix page by page.
+    Yields lists of (name, size, last_modified), only one page is held in memory.
+    """
+    storage = storage or default_storage
+    client = get_s3_client(storage)
+    if client is None:
+        root = storage.path(prefix)
+        page = []
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                name = os.path.relpath(path, storage.path('')).replace(os.sep, '/')
+                page.append((name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc)))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+        return
+
+    # Keys include the storage location, names do not
+    location = getattr(storage, 'location', '').strip('/')
+    strip = len(location) + 1 if location else 0
+    paginator = client.get_paginator('list_objects_v2')
+    pages = paginator.paginate(
+        Bucket=storage.bucket_name,
+        Prefix=storage._normalize_name(prefix),
+        PaginationConfig={'PageSize': page_size}
+    )
+    for response in pages:
+        page = [
+            (item['Key'][strip:], item['Size'], item['LastModified'])
+            for item in response.get('Contents', [])
+        ]
+        if page:
+            yield page
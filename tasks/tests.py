@@ -1,7 +1,91 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.utils import timezone
 from unittest.mock import patch, MagicMock
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from asgiref.sync import async_to_sync
+import asyncio
+import datetime
+import hashlib
+import io
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
 import unittest
+import zipfile
+from decimal import Decimal
+
+import boto3
+import numpy as np
+from PIL import Image
+
+try:
+    import requests
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+from .archives import astream_archive
+from .authentication import CachedJWTAuthentication, user_cache_key
+from .documents import (
+    batched_document_deletion, delete_storage_objects, register_blobs, save_task_documents, upload_blobs
+)
+from .geo import haversine_km
+from .geocoding import geocode, get_geocoder
+from .images import thumbnail_name
+from .locations import create_partitions, is_partitioned, partition_name, partitions
+from .models import (
+    User, Task, TaskDocument, DocumentBlob, GeocodeCache, InvitationCode, LocationPing, WorkerLocation
+)
+from .realtime import InProcessBroker, can_receive
+from .routing import distance_matrix, distances_from, plan_route, route_length
+from .serializers import TaskDocumentSerializer
+from .storage import get_s3_client
+from .uploads import HashingUploadHandler, IMAGE_HEADER_LIMIT
+from .views import generate_unique_code, generate_unique_codes
+
+
+def create_test_user(email, role='worker', **fields):
+    """Active user with the test password, the email is the username"""
+    return User.objects.create_user(username=email, email=email, password='Password1', role=role, **fields)
+
+
+class TaskFixturesMixin:
+    """Site manager with an API client, a temporary MEDIA_ROOT and a task factory, shared by the task tests"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.manager = create_test_user('manager@example.com', 'site_manager')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def _task(self, title='Task', lat=None, lng=None, days=0, hours=1, workers=(), **fields):
+        """Task starting in `days` days and lasting `hours` hours"""
+        task = Task.objects.create(
+            title=title, description='', start_date=timezone.now() + timezone.timedelta(days=days),
+            due_date=timezone.now() + timezone.timedelta(days=days, hours=hours),
+            created_by=self.manager, latitude=lat, longitude=lng, **fields
+        )
+        task.assigned_workers.add(*workers)
+        return task
+
 
 class FirebaseIntegrationTest(TestCase):
     """Test class for testing Firebase integration"""
@@ -125,3 +209,1022 @@ class FirebaseRealIntegrationTest(TestCase):
             
         except Exception as e:
             self.fail(f"Firebase mesaj gönderimi sırasında hata oluştu: {e}")
+
+class RealtimeEventsTest(TaskFixturesMixin, TestCase):
+    """Tests for real-time task events"""
+
+    def setUp(self):
+        super().setUp()
+        self.worker = create_test_user('worker@example.com')
+        self.other_worker = create_test_user('other@example.com')
+        self.task = self._task('Test Task')
+
+    def test_in_process_broker_delivers_events(self):
+        """Published events reach subscribers of the same process"""
+        broker = InProcessBroker()
+
+        async def scenario():
+            subscription = broker.subscribe()
+            broker.publish({'type': 'task.saved', 'task_id': 1, 'audience': [], 'data': {}})
+            event = await subscription.get(timeout=1)
+            subscription.close()
+            return event
+
+        event = asyncio.run(scenario())
+        self.assertEqual(event['task_id'], 1)
+        self.assertEqual(len(broker._subscribers), 0)
+
+    def test_assignment_event_visibility(self):
+        """Assignment events are only visible to managers and affected workers"""
+        events = []
+        with patch('tasks.realtime.get_broker') as mock_get_broker:
+            mock_get_broker.return_value.publish.side_effect = events.append
+            with self.captureOnCommitCallbacks(execute=True):
+                self.task.assigned_workers.add(self.worker)
+
+        event = events[-1]
+        self.assertEqual(event['type'], 'task.assignment_changed')
+        self.assertTrue(can_receive(self.manager, event))
+        self.assertTrue(can_receive(self.worker, event))
+        self.assertFalse(can_receive(self.other_worker, event))
+
+    def test_task_save_reads_the_audience_after_commit(self):
+        """Saving a task does not query its workers, the event reads them when it is published"""
+        self.task.assigned_workers.add(self.worker)
+        events = []
+        # Route invalidation reads the workers on its own
+        with patch('tasks.realtime.get_broker') as mock_get_broker, patch('tasks.signals.invalidate_routes'):
+            mock_get_broker.return_value.publish.side_effect = events.append
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as queries:
+                    self.task.save()
+
+        self.assertFalse([query for query in queries if 'assigned_workers' in query['sql']])
+        self.assertEqual((events[-1]['type'], events[-1]['audience']), ('task.saved', [self.worker.id]))
+
+S3_TEST_STORAGES = {
+    'default': {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {
+            'access_key': 'testing',
+            'secret_key': 'testing',
+            'bucket_name': 'workflow-test',
+            'region_name': 'us-east-1',
+            'querystring_auth': False,
+            'file_overwrite': False,
+        },
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+@unittest.skipIf(mock_aws is None, "moto is required for the S3 stand-in")
+class DirectUploadTest(TaskFixturesMixin, TestCase):
+    """Tests presigned uploads against a local S3 stand-in"""
+
+    def setUp(self):
+        super().setUp()
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='workflow-test')
+        self.task = self._task('Test Task')
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_presign_and_confirm(self):
+        """Uploaded objects are confirmed into blob documents in one request, the uploads are removed"""
+        data = make_test_image((640, 480))
+        with override_settings(STORAGES=S3_TEST_STORAGES):
+            response = self.client.post(
+                f'/api/tasks/{self.task.id}/documents/presign/',
+                {'document_type': 'ending', 'files': [
+                    {'name': 'a.jpg', 'content_type': 'image/jpeg'},
+                    {'name': 'b.jpg', 'content_type': 'image/jpeg'},
+                ]},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            uploads = response.data['uploads']
+
+            # Only the first file is uploaded
+            put = requests.put(uploads[0]['url'], data=data, headers=uploads[0]['headers'])
+            self.assertEqual(put.status_code, 200)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    f'/api/tasks/{self.task.id}/documents/confirm/',
+                    {'document_type': 'ending', 'keys': [upload['key'] for upload in uploads]},
+                    format='json'
+                )
+
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data['documents']), 1)
+            self.assertEqual(response.data['missing_keys'], [uploads[1]['key']])
+
+            document = TaskDocument.objects.get(task=self.task, document_type='ending')
+            self.assertEqual(document.file.name, DocumentBlob.objects.get(ref_count=1).file.name)
+            self.assertEqual(
+                (document.checksum, document.width, document.height), (hashlib.sha256(data).hexdigest(), 640, 480)
+            )
+            self.assertTrue(document.thumbnail)
+            self.assertEqual(Task.objects.values_list('ending_document_count', flat=True).get(), 1)
+            keys = [item['Key'] for item in boto3.client('s3', region_name='us-east-1').list_objects_v2(
+                Bucket='workflow-test', Prefix='task_documents/uploads/'
+            ).get('Contents', [])]
+            self.assertEqual(keys, [])
+
+    def test_confirm_rejects_foreign_keys(self):
+        """Keys outside the task's upload prefix cannot be claimed"""
+
+        with override_settings(STORAGES=S3_TEST_STORAGES):
+            response = self.client.post(
+                f'/api/tasks/{self.task.id}/documents/confirm/',
+                {'document_type': 'ending', 'keys': ['task_documents/other.jpg']},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 400)
+
+@override_settings(RESUMABLE_UPLOAD_MIN_CHUNK_SIZE=4)
+class ResumableUploadTest(TaskFixturesMixin, TestCase):
+    """Tests resumable chunked uploads on local storage"""
+
+    def setUp(self):
+        super().setUp()
+        self.worker = create_test_user('worker@example.com')
+        self.task = self._task('Test Task', workers=[self.worker])
+        self.client.force_authenticate(self.worker)
+
+    def _send_chunk(self, upload_id, offset, data):
+        return self.client.patch(
+            f'/api/uploads/{upload_id}/', data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_resume_and_assemble(self):
+        """Chunks are appended at the right offset and assembled into a document"""
+        response = self.client.post('/api/uploads/', {
+            'task': self.task.id, 'document_type': 'ending',
+            'filename': 'video.mp4', 'content_type': 'video/mp4', 'length': 10
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['id']
+
+        self.assertEqual(self._send_chunk(upload_id, 0, b'01234').status_code, 204)
+
+        # A retried chunk with a stale offset is rejected
+        self.assertEqual(self._send_chunk(upload_id, 0, b'01234').status_code, 409)
+
+        # Resume query returns the stored offset
+        response = self.client.head(f'/api/uploads/{upload_id}/')
+        self.assertEqual(response['Upload-Offset'], '5')
+
+        response = self._send_chunk(upload_id, 5, b'56789')
+        self.assertEqual(response.status_code, 201)
+
+        document = TaskDocument.objects.get(id=response.data['id'])
+        self.assertEqual(document.document_type, 'ending')
+        with document.file.open('rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+
+class SaveTaskDocumentsTest(TaskFixturesMixin, TestCase):
+    """Tests parallel document saving with bulk inserts"""
+
+    def setUp(self):
+        super().setUp()
+        self.task = self._task('Test Task')
+
+    def test_partial_failures_are_reported(self):
+        """Stored files are inserted in bulk, failed files are returned per file"""
+        files = [SimpleUploadedFile(f'photo{i}.jpg', f'data{i}'.encode()) for i in range(3)]
+        original_save = FileSystemStorage.save
+
+        def failing_save(storage, name, content, max_length=None):
+            if content.read() == b'data1':
+                raise IOError('Storage is not reachable')
+            content.seek(0)
+            return original_save(storage, name, content, max_length=max_length)
+
+        with patch.object(FileSystemStorage, 'save', failing_save):
+            documents, errors = save_task_documents(self.task, 'beginning', files, self.manager)
+
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(errors, [{'file': 'photo1.jpg', 'error': 'Storage is not reachable'}])
+        self.assertEqual(self.task.documents.count(), 2)
+
+    def test_query_count_does_not_grow_with_files(self):
+        """Rows are written with a constant number of queries"""
+        query_counts = []
+        for count in (2, 6):
+            files = [SimpleUploadedFile(f'{count}-{i}.pdf', f'{count}-{i}'.encode()) for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                save_task_documents(self.task, 'beginning', files, self.manager)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_identical_files_share_one_object(self):
+        """Identical content is stored once and removed with its last reference"""
+        files = [SimpleUploadedFile('plan.pdf', b'site plan'), SimpleUploadedFile('copy.pdf', b'site plan')]
+        documents, _ = save_task_documents(self.task, 'beginning', files, self.manager)
+
+        self.assertEqual(documents[0].file.name, documents[1].file.name)
+        blob = DocumentBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        path = documents[0].file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            documents[0].delete()
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            documents[1].delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_metadata_is_stored_and_backfilled(self):
+        """Size, type, dimensions and checksum come from the upload, older rows are backfilled"""
+        data = make_test_image((640, 480))
+        photo = SimpleUploadedFile('photo.jpg', data, content_type='image/jpeg')
+        (document,), _ = save_task_documents(self.task, 'beginning', [photo], self.manager)
+
+        document.refresh_from_db()
+        expected = (hashlib.sha256(data).hexdigest(), len(data), 'image/jpeg', 640, 480)
+        self.assertEqual(
+            (document.checksum, document.size, document.content_type, document.width, document.height),
+            expected
+        )
+
+        # Rows uploaded before the columns existed
+        TaskDocument.objects.update(checksum='', size=None, content_type='', width=None, height=None)
+        call_command('backfill_document_metadata', stdout=io.StringIO())
+        document.refresh_from_db()
+        self.assertEqual(
+            (document.checksum, document.size, document.content_type, document.width, document.height),
+            expected
+        )
+
+        response = self.client.get('/api/documents/', {'content_type': 'image/', 'size_min': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [document.id])
+
+class DocumentCounterTest(TaskFixturesMixin, TestCase):
+    """Tests the per-task document counters kept with F() updates"""
+
+    def setUp(self):
+        super().setUp()
+        self.task = self._task('Test Task')
+        files = [SimpleUploadedFile(f'{i}.pdf', f'content {i}'.encode()) for i in range(3)]
+        save_task_documents(self.task, 'beginning', files, self.manager)
+
+    def _counts(self):
+        return Task.objects.values_list('starting_document_count', 'ending_document_count').get()
+
+    def test_counters_follow_document_changes(self):
+        """Counters follow creates, type changes and deletes, the list uses them instead of documents"""
+        document = TaskDocument.objects.create(
+            task=self.task, document_type='ending', uploaded_by=self.manager,
+            file=SimpleUploadedFile('end.pdf', b'end')
+        )
+        self.assertEqual(self._counts(), (3, 1))
+
+        document.document_type = 'beginning'
+        document.save()
+        self.assertEqual(self._counts(), (4, 0))
+
+        self.task.documents.first().delete()
+        with batched_document_deletion():
+            TaskDocument.objects.filter(id__in=list(self.task.documents.values_list('id', flat=True)[:2])).delete()
+        self.assertEqual(self._counts(), (1, 0))
+
+        item = self.client.get('/api/tasks/').data['results'][0]
+        self.assertEqual((item['starting_document_count'], item['ending_document_count']), (1, 0))
+        self.assertNotIn('documents', item)
+        self.assertIn('documents', self.client.get(f'/api/tasks/{self.task.id}/').data)
+
+    def test_task_saves_leave_counters_out(self):
+        """Updating and completing a task does not write back the counters it loaded"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/tasks/{self.task.id}/', {'title': 'Renamed'}, format='multipart')
+            self.client.post(f'/api/tasks/{self.task.id}/complete/', {
+                'completion_documents': [SimpleUploadedFile('end.pdf', b'end')]
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['starting_document_count'], response.data['ending_document_count']), (3, 0))
+        saves = [query['sql'] for query in queries
+                 if query['sql'].startswith('UPDATE "tasks_task"') and '"title"' in query['sql']]
+        self.assertEqual(len(saves), 2)
+        self.assertFalse([sql for sql in saves if 'document_count' in sql])
+        self.assertEqual(self._counts(), (3, 1))
+
+    def test_counters_are_reconciled(self):
+        Task.objects.update(starting_document_count=7)
+        output = io.StringIO()
+        call_command('reconcile_document_counts', stdout=output)
+        self.assertIn('fixed: 1', output.getvalue())
+        self.assertEqual(self._counts(), (3, 0))
+
+@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+class StreamingUploadTest(TaskFixturesMixin, TestCase):
+    """Tests that uploads are spooled to disk and hashed while they are received"""
+
+    def setUp(self):
+        super().setUp()
+        self.worker = create_test_user('worker@example.com')
+
+    def test_metadata_is_computed_while_streaming(self):
+        """Files above the memory threshold are not read again to compute their metadata"""
+        data = make_test_image((800, 600), 'PNG')
+        photo = SimpleUploadedFile('plan.png', data, content_type='image/png')
+
+        with patch('tasks.documents.compute_checksum') as mock_checksum:
+            response = self.client.post('/api/tasks/', {
+                'title': 'Streamed', 'description': 'Test', 'assigned_workers': [self.worker.id],
+                'start_date': timezone.now().isoformat(), 'due_date': timezone.now().isoformat(),
+                'starting_documents': [photo]
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        mock_checksum.assert_not_called()
+        document = Task.objects.get().documents.get()
+        self.assertEqual(document.checksum, hashlib.sha256(data).hexdigest())
+        self.assertEqual((document.size, document.width, document.height), (len(data), 800, 600))
+
+    def test_undecodable_image_is_not_buffered(self):
+        """The image parser stops after the header limit for formats Pillow cannot read"""
+        handler = HashingUploadHandler()
+        handler.in_memory = True
+        handler.new_file('file', 'photo.heic', 'image/heic', 4 * IMAGE_HEADER_LIMIT)
+        with patch('PIL.ImageFile.Parser.feed') as mock_feed:
+            for start in range(0, 4 * IMAGE_HEADER_LIMIT, 65536):
+                handler.receive_data_chunk(b'\0' * 65536, start)
+
+        self.assertIsNone(handler.image_parser)
+        self.assertEqual(sum(len(call.args[0]) for call in mock_feed.call_args_list), IMAGE_HEADER_LIMIT)
+        self.assertIsNone(handler.file_complete(4 * IMAGE_HEADER_LIMIT).image_size)
+
+class DocumentDownloadTest(TaskFixturesMixin, TestCase):
+    """Tests the protected document download endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        self.worker = create_test_user('worker@example.com')
+        self.task = self._task('Test Task')
+        files = [SimpleUploadedFile('report.pdf', b'report', content_type='application/pdf')]
+        (self.document,), _ = save_task_documents(self.task, 'ending', files, self.manager)
+
+    def test_only_visible_documents_can_be_downloaded(self):
+        """Workers not assigned to the task get a 404"""
+        self.client.force_authenticate(self.worker)
+        response = self.client.get(f'/api/documents/{self.document.id}/download/')
+        self.assertEqual(response.status_code, 404)
+
+        self.task.assigned_workers.add(self.worker)
+        with override_settings(DOCUMENT_DOWNLOAD_MODE='direct'):
+            response = self.client.get(f'/api/documents/{self.document.id}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'report')
+
+    @override_settings(DOCUMENT_DOWNLOAD_MODE='accel')
+    def test_accel_redirect_hands_the_file_to_nginx(self):
+        """The response has no body, nginx serves the file"""
+        self.client.force_authenticate(self.manager)
+        response = self.client.get(f'/api/documents/{self.document.id}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/media/{self.document.file.name}')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response.content, b'')
+
+    @unittest.skipIf(mock_aws is None, "moto is required for the S3 stand-in")
+    @override_settings(DOCUMENT_DOWNLOAD_MODE='redirect')
+    def test_s3_documents_redirect_to_presigned_url(self):
+        """S3 objects are served with a short lived presigned URL"""
+        self.client.force_authenticate(self.manager)
+        with mock_aws(), override_settings(STORAGES=S3_TEST_STORAGES):
+            response = self.client.get(f'/api/documents/{self.document.id}/download/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(self.document.file.name, response['Location'])
+        self.assertIn('Expires=', response['Location'])
+
+class DocumentDeletionTest(TaskFixturesMixin, TestCase):
+    """Tests batched storage deletion of documents and cascades"""
+
+    def setUp(self):
+        super().setUp()
+        self.task = self._task('Test Task')
+
+    def _upload(self, count):
+        files = [SimpleUploadedFile(f'{i}.pdf', f'content {i}'.encode()) for i in range(count)]
+        documents, _ = save_task_documents(self.task, 'beginning', files, self.manager)
+        return [document.file.path for document in documents]
+
+    def test_task_cascade_deletes_files_in_one_batch(self):
+        """Deleting a task removes its document files with one storage batch after commit"""
+        paths = self._upload(3)
+
+        with patch('tasks.documents.delete_storage_objects', side_effect=delete_storage_objects) as mock_delete:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(f'/api/tasks/{self.task.id}/')
+
+        self.assertEqual(response.status_code, 204)
+        mock_delete.assert_called_once()
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_rolled_back_delete_keeps_files(self):
+        """Objects scheduled by a rolled back transaction are not deleted"""
+        path, = self._upload(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.task.documents.get().delete()
+                    raise RuntimeError('rollback')
+            except RuntimeError:
+                pass
+        self.assertTrue(os.path.exists(path))
+
+    def test_blob_deleted_after_upload_is_written_again(self):
+        """A blob whose last reference and object went away between upload and register is stored again"""
+        path, = self._upload(1)
+        file = SimpleUploadedFile('again.pdf', b'content 0')
+        (blob, error), = upload_blobs([file])
+        self.assertIsNone(error)
+
+        # A concurrent delete of the only document releases the blob and removes its object
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.documents.get().delete()
+        self.assertFalse(os.path.exists(path))
+
+        names = register_blobs([blob], [file])
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(DocumentBlob.objects.get(file=names[blob.checksum]).ref_count, 1)
+
+    def test_orphaned_files_are_collected(self):
+        """Only unreferenced objects older than the grace period are deleted"""
+        path, = self._upload(1)
+        old_orphan = default_storage.path(default_storage.save('task_documents/lost.pdf', ContentFile(b'lost')))
+        new_orphan = default_storage.path(default_storage.save('task_documents/uploading.pdf', ContentFile(b'new')))
+        two_days_ago = time.time() - 48 * 3600
+        for old_path in (path, old_orphan):
+            os.utime(old_path, (two_days_ago, two_days_ago))
+
+        call_command('collect_orphaned_files', '--delete', '--dry-run', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(old_orphan))
+
+        output = io.StringIO()
+        call_command('collect_orphaned_files', '--delete', stdout=output)
+        self.assertIn('orphaned: 1', output.getvalue())
+        self.assertFalse(os.path.exists(old_orphan))
+        self.assertTrue(os.path.exists(new_orphan))
+        self.assertTrue(os.path.exists(path))
+
+    @unittest.skipIf(mock_aws is None, "moto is required for the S3 stand-in")
+    def test_s3_objects_are_deleted_with_delete_objects(self):
+        """S3 keys are removed with DeleteObjects requests of up to 1000 keys"""
+        with mock_aws(), override_settings(STORAGES=S3_TEST_STORAGES):
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='workflow-test')
+            names = [f'task_documents/orphan-{i}.txt' for i in range(1005)]
+            for name in names:
+                s3.put_object(Bucket='workflow-test', Key=name, Body=b'x')
+
+            client = get_s3_client()
+            with patch.object(client, 'delete_objects', wraps=client.delete_objects) as mock_delete:
+                delete_storage_objects(names)
+
+            self.assertEqual(mock_delete.call_count, 2)
+            self.assertEqual(s3.list_objects_v2(Bucket='workflow-test').get('KeyCount'), 0)
+
+def make_test_image(size=(1200, 800), image_format='JPEG', orientation=None):
+    """Returns bytes of a generated test image"""
+    image = Image.new('RGB', size, color=(200, 50, 50))
+    options = {}
+    if orientation:
+        exif = image.getexif()
+        exif[0x0112] = orientation
+        options['exif'] = exif.tobytes()
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class DocumentProcessingTest(TaskFixturesMixin, TestCase):
+    """Tests background photo normalization and thumbnail generation"""
+
+    def setUp(self):
+        super().setUp()
+        self.task = self._task('Test Task')
+
+    def test_thumbnail_generated_on_upload(self):
+        """Image uploads get a small thumbnail next to the original"""
+        files = [
+            SimpleUploadedFile('photo.jpg', make_test_image()),
+            SimpleUploadedFile('report.pdf', b'%PDF-1.4'),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            documents, _ = save_task_documents(self.task, 'beginning', files, self.manager)
+
+        photo, report = [document.__class__.objects.get(pk=document.pk) for document in documents]
+        self.assertEqual(photo.thumbnail.name, thumbnail_name(photo.file.name))
+        with photo.thumbnail.open('rb') as thumbnail:
+            self.assertLessEqual(max(Image.open(thumbnail).size), 320)
+        self.assertFalse(report.thumbnail)
+
+        data = TaskDocumentSerializer(photo).data
+        self.assertTrue(data['thumbnail_url'].endswith('_thumb.webp'))
+        self.assertIsNone(TaskDocumentSerializer(report).data['thumbnail_url'])
+
+    @override_settings(PHOTO_MAX_DIMENSION=1000, PHOTO_KEEP_ORIGINAL=True)
+    def test_large_photo_is_normalized(self):
+        """Large photos are downscaled, rotated upright and the original is kept"""
+        # Orientation 6: camera was rotated, image must be turned 90 degrees
+        files = [SimpleUploadedFile('photo.jpg', make_test_image((3000, 2000), orientation=6))]
+        with self.captureOnCommitCallbacks(execute=True):
+            documents, _ = save_task_documents(self.task, 'ending', files, self.manager)
+
+        document = TaskDocument.objects.get(pk=documents[0].pk)
+        self.assertIsNotNone(document.processed_at)
+        self.assertGreater(document.bytes_saved, 0)
+        self.assertTrue(document.original_file.name.startswith('task_documents/blobs/'))
+        self.assertNotEqual(document.original_file.name, document.file.name)
+        with document.file.open('rb') as f:
+            image = Image.open(f)
+            self.assertEqual(image.size, (667, 1000))
+            self.assertNotIn(0x0112, image.getexif())
+
+class DocumentArchiveTest(TaskFixturesMixin, TestCase):
+    """Tests streaming ZIP export of task documents"""
+
+    def setUp(self):
+        super().setUp()
+        self.task = self._task('Test Task')
+
+    def test_archive_contains_all_documents(self):
+        """Archive is streamed and contains starting and ending documents"""
+        starting, _ = save_task_documents(
+            self.task, 'beginning', [SimpleUploadedFile('plan.pdf', b'plan' * 1000)], self.manager
+        )
+        ending, _ = save_task_documents(
+            self.task, 'ending', [SimpleUploadedFile('photo.jpg', b'photo' * 1000)], self.manager
+        )
+
+        response = self.client.get(f'/api/tasks/{self.task.id}/documents/archive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.read(f'starting/{starting[0].id}.pdf'), b'plan' * 1000)
+        self.assertEqual(archive.read(f'ending/{ending[0].id}.jpg'), b'photo' * 1000)
+
+    def test_async_archive_is_streamed_in_chunks(self):
+        """The ASGI variant yields the archive chunk by chunk instead of one collected body"""
+        documents, _ = save_task_documents(
+            self.task, 'beginning', [SimpleUploadedFile('plan.pdf', b'plan' * 1000)], self.manager
+        )
+
+        async def collect():
+            return [chunk async for chunk in astream_archive(documents, chunk_size=1000)]
+
+        chunks = async_to_sync(collect)()
+        self.assertGreater(len(chunks), 2)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(archive.read(f'starting/{documents[0].id}.pdf'), b'plan' * 1000)
+
+class AuthenticationTest(TaskFixturesMixin, TestCase):
+    """Tests login and JWT authentication with cached users"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _login(self):
+        response = APIClient().post(
+            '/api/token/', {'email': 'manager@example.com', 'password': 'Password1'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return client
+
+    def test_user_is_loaded_from_cache(self):
+        """Only the first request reads the users table, saving the user refreshes it"""
+        client = self._login()
+        client.get('/api/users/me/')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'tasks_user' in query['sql']])
+
+        self.manager.role = 'worker'
+        self.manager.save()
+        self.assertEqual(client.get('/api/users/me/').data['role'], 'Worker')
+
+    def test_password_hash_is_not_cached(self):
+        """Only the listed fields are cached, the rest is loaded when a request reads it"""
+        client = self._login()
+        client.get('/api/users/me/')
+        values = cache.get(user_cache_key(self.manager.pk, 0))
+        self.assertNotIn(self.manager.password, values.values())
+
+        token = CachedJWTAuthentication().get_validated_token(client._credentials['HTTP_AUTHORIZATION'].split()[1])
+        user = CachedJWTAuthentication().get_user(token)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual((user.pk, user.role), (self.manager.pk, 'site_manager'))
+        self.assertEqual(len(queries), 0)
+        self.assertTrue(user.check_password('Password1'))
+
+    def test_deactivation_and_revocation(self):
+        """Deactivated users and revoked tokens are rejected right away"""
+        client = self._login()
+        self.assertEqual(client.get('/api/users/me/').status_code, 200)
+
+        self.manager.revoke_tokens()
+        self.manager.save()
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+        client = self._login()
+        self.manager.is_active = False
+        self.manager.save()
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+    def test_login_hashes_once_and_upgrades_hash(self):
+        """A login runs one user query and one hash check, outdated hashes are replaced"""
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            with patch('django.contrib.auth.base_user.check_password', side_effect=check_password) as mock_check:
+                with CaptureQueriesContext(connection) as queries:
+                    response = APIClient().post(
+                        '/api/token/', {'email': 'manager@example.com', 'password': 'Password1'}, format='json'
+                    )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_check.call_count, 1)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('SELECT')]), 1)
+        self.manager.refresh_from_db()
+        self.assertTrue(self.manager.password.startswith('pbkdf2_sha256$1000$'))
+
+class InvitationTest(TaskFixturesMixin, TestCase):
+    """Tests bulk invitations, invitation listing and the expiry sweep"""
+
+    def test_bulk_invitations(self):
+        """Registered and invited emails are skipped, the rest are created with one email batch"""
+        InvitationCode.objects.create(
+            code=generate_unique_code(), email='invited@example.com', created_by=self.manager,
+            expires_at=timezone.now() + timezone.timedelta(hours=1)
+        )
+        emails = [f'worker{i}@example.com' for i in range(20)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/invitations/bulk-create/', {
+                'emails': emails + ['worker0@example.com', 'manager@example.com', 'invited@example.com']
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], emails)
+        self.assertEqual([item['email'] for item in response.data['skipped']],
+                         ['manager@example.com', 'invited@example.com'])
+        self.assertLess(len(queries), 10)
+
+        codes = set(InvitationCode.objects.values_list('code', flat=True))
+        self.assertEqual(len(codes), 21)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(emails))
+
+    def test_invitation_list_and_sweep(self):
+        """Listing filters by state in the database, the sweep removes old unused codes"""
+        now = timezone.now()
+        codes = generate_unique_codes(4)
+        InvitationCode.objects.bulk_create([
+            InvitationCode(code=codes[0], email='active@example.com', created_by=self.manager,
+                           expires_at=now + timezone.timedelta(hours=1)),
+            InvitationCode(code=codes[1], email='expired@example.com', created_by=self.manager,
+                           expires_at=now - timezone.timedelta(days=60)),
+            InvitationCode(code=codes[2], email='used@example.com', created_by=self.manager,
+                           expires_at=now - timezone.timedelta(days=60), is_used=True),
+            InvitationCode(code=codes[3], email='cancelled@example.com', created_by=self.manager,
+                           expires_at=now + timezone.timedelta(hours=1), is_cancelled=True),
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/invitations/list/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(queries), 1)
+
+        response = self.client.get('/api/invitations/list/', {'state': 'expired'})
+        self.assertEqual([item['email'] for item in response.data['results']], ['expired@example.com'])
+        self.assertTrue(response.data['results'][0]['is_expired'])
+
+        call_command('sweep_invitations', stdout=io.StringIO())
+        self.assertEqual(
+            set(InvitationCode.objects.values_list('email', flat=True)),
+            {'active@example.com', 'used@example.com', 'cancelled@example.com'}
+        )
+
+
+class UserSearchTest(TestCase):
+    """Tests the user directory search used for task assignment"""
+
+    def setUp(self):
+        self.manager = create_test_user('manager@example.com', 'site_manager', first_name='Selin', last_name='Kaya')
+        self.worker = create_test_user(
+            'ahmet@example.com', first_name='Ahmet', last_name='Yilmaz', phone='5551234567'
+        )
+        create_test_user('mehmet@example.com', first_name='Mehmet', last_name='Kaya', phone='5559876543')
+        create_test_user('former@example.com', first_name='Ahmet', last_name='Former', is_active=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def _search(self, **params):
+        response = self.client.get('/api/users/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['email'] for item in response.data]
+
+    def test_search_by_name_email_and_phone(self):
+        """Every term must match one of the fields, inactive users are left out"""
+        self.assertEqual(self._search(q='ahm'), ['ahmet@example.com'])
+        self.assertEqual(self._search(q='kaya'), ['mehmet@example.com', 'manager@example.com'])
+        self.assertEqual(self._search(q='kaya', role='worker'), ['mehmet@example.com'])
+        self.assertEqual(self._search(q='mehmet kay'), ['mehmet@example.com'])
+        self.assertEqual(self._search(q='555123'), ['ahmet@example.com'])
+        self.assertEqual(len(self._search(q='', limit=1)), 1)
+
+        response = self.client.get('/api/users/search/', {'q': 'ahmet'})
+        self.assertEqual(set(response.data[0]), {'id', 'first_name', 'last_name', 'email', 'role'})
+
+    def test_search_requires_site_manager(self):
+        self.client.force_authenticate(self.worker)
+        self.assertEqual(self.client.get('/api/users/search/', {'q': 'kaya'}).status_code, 403)
+
+
+class NearbyTasksTest(TaskFixturesMixin, TestCase):
+    """Tests the nearby tasks query"""
+
+    def setUp(self):
+        super().setUp()
+        self.worker = create_test_user('worker@example.com')
+
+    def test_tasks_are_ordered_by_distance(self):
+        """Only open tasks inside the radius are returned, nearest first"""
+        # Around Taksim, Istanbul
+        self._task('Far', '41.060000', '28.987000')
+        near = self._task('Near', '41.037500', '28.985000')
+        self._task('Nearest', '41.036900', '28.985100')
+        self._task('Done', '41.036900', '28.985000', status='completed')
+        self._task('Ankara', '39.925000', '32.836900')
+        self._task('No location', None, None)
+
+        response = self.client.get('/api/tasks/nearby/', {'lat': 41.0369, 'lng': 28.9850, 'radius': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['title'] for item in response.data], ['Nearest', 'Near', 'Far'])
+        self.assertAlmostEqual(
+            response.data[1]['distance_km'], haversine_km(41.0369, 28.9850, near.latitude, near.longitude), places=3
+        )
+
+        # Workers only see their own tasks
+        near.assigned_workers.add(self.worker)
+        self.client.force_authenticate(self.worker)
+        response = self.client.get('/api/tasks/nearby/', {'lat': 41.0369, 'lng': 28.9850, 'radius': 5})
+        self.assertEqual([item['title'] for item in response.data], ['Near'])
+
+        self.assertEqual(self.client.get('/api/tasks/nearby/', {'lat': 41.0369}).status_code, 400)
+
+    def test_bounding_box_wraps_the_antimeridian(self):
+        self._task('Fiji east', '-17.800000', '179.990000')
+        self._task('Fiji west', '-17.800000', '-179.990000')
+
+        response = self.client.get('/api/tasks/nearby/', {'lat': -17.8, 'lng': 179.999, 'radius': 5})
+        self.assertEqual([item['title'] for item in response.data], ['Fiji east', 'Fiji west'])
+
+
+class RouteTest(TaskFixturesMixin, TestCase):
+    """Tests the daily route of a worker"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.worker = create_test_user('worker@example.com')
+        self.client.force_authenticate(self.worker)
+
+    def _task(self, title, lat, lng, days=0):
+        return super()._task(title, lat, lng, days=days, workers=[self.worker])
+
+    def test_plan_route_matches_shortest_path(self):
+        """On small inputs the heuristic finds the same length as trying every order"""
+        rng = random.Random(3)
+        points = [(41 + rng.random() / 10, 29 + rng.random() / 10) for _ in range(7)]
+        matrix = distance_matrix(points)
+        np.testing.assert_allclose(distances_from(points[2], points), matrix[2], atol=1e-9)
+        shortest = min(route_length(list(order), matrix) for order in itertools.permutations(range(7)))
+
+        order, legs = plan_route(points, time_budget=1)
+        self.assertEqual(sorted(order), list(range(7)))
+        self.assertAlmostEqual(sum(legs), shortest, places=6)
+        self.assertAlmostEqual(route_length(order, matrix), shortest, places=6)
+
+    def test_route_is_cached_until_assignments_change(self):
+        # Stops along a line, created out of order
+        for index in [3, 0, 4, 1, 2]:
+            self._task(f'Stop {index}', f'41.{index}00000', '29.000000')
+        self._task('Tomorrow', '41.250000', '29.000000', days=1)
+        self._task('No location', None, None)
+
+        response = self.client.get('/api/tasks/route/', {'lat': 40.9, 'lng': 29.0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [task['title'] for task in response.data['tasks']],
+            ['Stop 0', 'Stop 1', 'Stop 2', 'Stop 3', 'Stop 4', 'No location']
+        )
+        self.assertAlmostEqual(response.data['tasks'][1]['distance_from_previous_km'], 11.12, places=1)
+        self.assertIsNone(response.data['tasks'][-1]['distance_from_previous_km'])
+
+        with patch('tasks.views.plan_route') as mock_plan:
+            self.client.get('/api/tasks/route/', {'lat': 40.9, 'lng': 29.0})
+            # A nearby position shares the cached order, the first leg starts from it
+            nearby = self.client.get('/api/tasks/route/', {'lat': 40.904, 'lng': 29.0})
+        mock_plan.assert_not_called()
+        self.assertAlmostEqual(nearby.data['tasks'][0]['distance_from_previous_km'], 10.675, places=2)
+        self.assertAlmostEqual(
+            nearby.data['total_distance_km'], response.data['total_distance_km'] - 0.445, places=2
+        )
+
+        extra = self._task('Stop 5', '41.500000', '29.000000')
+        response = self.client.get('/api/tasks/route/', {'lat': 40.9, 'lng': 29.0})
+        self.assertEqual(response.data['tasks'][5]['id'], extra.id)
+
+        # Site managers ask for a worker's route
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/tasks/route/').status_code, 400)
+        response = self.client.get('/api/tasks/route/', {'worker': self.worker.id})
+        self.assertEqual(len(response.data['tasks']), 7)
+
+
+class SuggestedWorkersTest(TaskFixturesMixin, TestCase):
+    """Tests worker suggestions for a task"""
+
+    def setUp(self):
+        super().setUp()
+        self.workers = [create_test_user(f'worker{index}@example.com') for index in range(3)]
+
+    def _task(self, lat, lng, **fields):
+        return super()._task('Task', lat, lng, hours=4, **fields)
+
+    def test_workers_are_ranked_with_a_constant_number_of_queries(self):
+        busy, nearby, idle = self.workers
+        task = self._task('41.000000', '29.000000', workers=[nearby])
+        # Busy at the same time, far away
+        self._task('39.900000', '32.800000', workers=[busy])
+        self._task('39.900000', '32.800000', workers=[busy])
+        # Works close by on another day, completed tasks do not count
+        self._task('41.010000', '29.000000', days=3, workers=[nearby])
+        self._task('41.000000', '29.000000', workers=[idle], status='completed')
+        # Same workload as nearby, but far away
+        self._task('39.900000', '32.800000', days=5, workers=[idle])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/tasks/{task.id}/suggested-workers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), 5)
+
+        self.assertEqual([item['id'] for item in response.data], [nearby.id, idle.id, busy.id])
+        first, second, last = response.data
+        self.assertEqual((first['open_tasks'], first['overlapping_tasks'], first['is_assigned']), (1, 0, True))
+        self.assertAlmostEqual(first['distance_km'], 1.112, places=2)
+        self.assertEqual(second['open_tasks'], 1)
+        self.assertGreater(second['distance_km'], 300)
+        self.assertEqual((last['open_tasks'], last['overlapping_tasks']), (2, 2))
+        self.assertGreater(first['score'], last['score'])
+
+        # More workers do not add queries
+        User.objects.bulk_create([
+            User(username=f'extra{index}@example.com', email=f'extra{index}@example.com', role='worker')
+            for index in range(20)
+        ])
+        with CaptureQueriesContext(connection) as more_queries:
+            self.client.get(f'/api/tasks/{task.id}/suggested-workers/')
+        self.assertEqual(len(more_queries), len(queries))
+
+        self.client.force_authenticate(busy)
+        self.assertEqual(self.client.get(f'/api/tasks/{task.id}/suggested-workers/').status_code, 403)
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    GEOCODING_PROVIDER='tasks.geocoding.FixtureGeocoder',
+    GEOCODING_FIXTURE={'Atatürk Cad. No:5, Kadıköy, İstanbul': [40.990123, 29.027456]}
+)
+class GeocodingTest(TaskFixturesMixin, TestCase):
+    """Tests geocoding of task addresses"""
+
+    def _task(self, address, lat=None, lng=None):
+        # Geocoding is queued after commit, the callbacks run it eagerly
+        with self.captureOnCommitCallbacks(execute=True):
+            task = super()._task(address=address, lat=lat, lng=lng)
+        task.refresh_from_db()
+        return task
+
+    def test_coordinates_are_filled_from_the_address(self):
+        task = self._task('Atatürk Cad. No:5, Kadıköy, İstanbul')
+        self.assertEqual((task.latitude, task.longitude), (Decimal('40.990123'), Decimal('29.027456')))
+
+        # Same site written differently, answered from the cache
+        task = self._task('ATATÜRK CAD NO 5  KADIKÖY İSTANBUL')
+        self.assertEqual(task.latitude, Decimal('40.990123'))
+        self.assertEqual(get_geocoder().calls, 1)
+        self.assertEqual(GeocodeCache.objects.count(), 1)
+
+        # Unknown addresses are remembered too, entered coordinates are kept
+        self.assertIsNone(self._task('Nowhere').latitude)
+        self.assertIsNone(self._task('nowhere').latitude)
+        self.assertEqual(get_geocoder().calls, 2)
+        task = self._task('Atatürk Cad. No:5, Kadıköy, İstanbul', lat='41.000000', lng='29.000000')
+        self.assertEqual(task.latitude, Decimal('41.000000'))
+
+    def test_lru_is_in_front_of_the_cache_table(self):
+        geocode('Atatürk Cad. No:5, Kadıköy, İstanbul')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNotNone(geocode('atatürk cad no:5 kadıköy istanbul'))
+        self.assertEqual(len(queries), 0)
+
+
+class LocationCheckinTest(TaskFixturesMixin, TestCase):
+    """Tests location check-ins and the latest position of workers"""
+
+    def setUp(self):
+        super().setUp()
+        self.worker = create_test_user('worker@example.com', first_name='Ali')
+        self.client.force_authenticate(self.worker)
+
+    def _point(self, minutes_ago, lat=41.0, lng=29.0):
+        return {
+            'latitude': lat, 'longitude': lng, 'accuracy': 8,
+            'recorded_at': (timezone.now() - timezone.timedelta(minutes=minutes_ago)).isoformat()
+        }
+
+    def test_points_are_stored_in_one_insert(self):
+        points = [self._point(minutes, lat=41 + minutes / 1000) for minutes in range(100, 0, -1)]
+        points.append(self._point(60 * 48))  # Too old
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/locations/check-in/', {'points': points}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'accepted': 100, 'rejected': 1})
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 2)
+        self.assertEqual(LocationPing.objects.count(), 100)
+
+        location = WorkerLocation.objects.get(worker=self.worker)
+        self.assertAlmostEqual(location.latitude, 41.001)
+
+        # A batch sent late does not move the position back
+        self.client.post('/api/locations/check-in/', {'points': [self._point(30, lat=40.0)]}, format='json')
+        location.refresh_from_db()
+        self.assertAlmostEqual(location.latitude, 41.001)
+
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/locations/latest/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item['worker'], item['full_name']) for item in response.data], [(self.worker.id, 'Ali')])
+
+        self.client.force_authenticate(self.worker)
+        self.assertEqual(self.client.get('/api/locations/latest/').status_code, 403)
+        self.assertEqual(self.client.post(
+            '/api/locations/check-in/', {'points': [dict(self._point(1), latitude=120)]}, format='json'
+        ).status_code, 400)
+
+    def test_expired_pings_are_removed(self):
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        # The past days and the ones the command ensures, it only drops partitions then
+        create_partitions(today - datetime.timedelta(days=40), 40 + settings.LOCATION_PARTITION_DAYS_AHEAD + 2)
+        LocationPing.objects.bulk_create([
+            LocationPing(worker=self.worker, latitude=41, longitude=29,
+                         recorded_at=timezone.now() - timezone.timedelta(days=days))
+            for days in (0, 10, 40)
+        ])
+        if is_partitioned():
+            # DROP TABLE refuses tables with pending foreign key checks of this transaction
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        call_command('maintain_location_partitions', stdout=io.StringIO())
+
+        self.assertEqual(LocationPing.objects.count(), 2)
+        if is_partitioned():
+            tables = partitions()
+            self.assertNotIn(partition_name(today - datetime.timedelta(days=40)), tables)
+            self.assertIn(partition_name(today - datetime.timedelta(days=10)), tables)
+            self.assertIn(partition_name(today + datetime.timedelta(days=settings.LOCATION_PARTITION_DAYS_AHEAD)), tables)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'LocationPing is only partitioned on PostgreSQL')
+    def test_missing_partition_fails_the_request(self):
+        """Check-ins for a day without partition are rejected instead of creating it in the request"""
+        point = self._point(1)
+        day = datetime.datetime.fromisoformat(point['recorded_at']).astimezone(datetime.timezone.utc).date()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {partition_name(day)}')
+
+        response = self.client.post('/api/locations/check-in/', {'points': [point]}, format='json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn(partition_name(day), partitions())
+        self.assertFalse(WorkerLocation.objects.filter(worker=self.worker).exists())
@@ -0,0 +1,110 @@
+"""
+Streaming handling of uploaded files.
+
+HashingUploadHandler replaces Django's default upload handlers: small
+requests stay in memory, larger files are spooled to a temporary file chunk
+by chunk. SHA-256 and image dimensions are computed in the same pass, so a
+document is not read again before it is sent to the storage (S3 storages
+stream the temporary file with multipart uploads).
+"""
+import hashlib
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler
+from PIL import ImageFile
+
+from .images import is_image_name
+
+READ_CHUNK_SIZE = 65536
+# Dimensions are in the first bytes of supported formats, the parser buffers what it cannot decode
+IMAGE_HEADER_LIMIT = 262144
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stores uploads in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE, on disk above it.
+    Uploaded files get `sha256` and `image_size` attributes.
+    """
+    in_memory = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Same rule as MemoryFileUploadHandler, decided per request
+        self.in_memory = content_length <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+
+    def new_file(self, *args, **kwargs):
+        if self.in_memory:
+            FileUploadHandler.new_file(self, *args, **kwargs)
+            self.file = BytesIO()
+        else:
+            super().new_file(*args, **kwargs)
+
+        self.digest = hashlib.sha256()
+        self.image_size = None
+        is_image = (self.content_type or '').startswith('image/') or is_image_name(self.file_name)
+        self.image_parser = ImageFile.Parser() if is_image else None
+        self.image_bytes_fed = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        if self.image_parser is not None:
+            self._read_image_size(raw_data)
+        self.file.write(raw_data)
+
+    def _read_image_size(self, raw_data):
+        # The parser only needs the first chunks, it is dropped once the header is read or the limit is reached
+        if self.image_bytes_fed >= IMAGE_HEADER_LIMIT:
+            self.image_parser = None
+            return
+        raw_data = raw_data[:IMAGE_HEADER_LIMIT - self.image_bytes_fed]
+        self.image_bytes_fed += len(raw_data)
+        try:
+            self.image_parser.feed(raw_data)
+        except Exception:
+            self.image_parser = None
+            return
+        if self.image_parser.image is not None:
+            self.image_size = self.image_parser.image.size
+            self.image_parser = None
+
+    def file_complete(self, file_size):
+        if self.in_memory:
+            self.file.seek(0)
+            uploaded_file = InMemoryUploadedFile(
+                file=self.file,
+                field_name=self.field_name,
+                name=self.file_name,
+                content_type=self.content_type,
+                size=file_size,
+                charset=self.charset,
+                content_type_extra=self.content_type_extra
+            )
+        else:
+            uploaded_file = super().file_complete(file_size)
+
+        uploaded_file.sha256 = self.digest.hexdigest()
+        uploaded_file.image_size = self.image_size
+        return uploaded_file
+
+
+def spool_request_body(request, limit):
+    """
+    Reads a raw request body (resumable upload chunk) in pieces, spooling to disk
+    above FILE_UPLOAD_MAX_MEMORY_SIZE instead of buffering it in request.body.
+    Returns the file and the body size, the file is None if the body exceeds limit.
+    """
+    spool = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    size = 0
+    while True:
+        chunk = request.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            spool.close()
+            return None, size
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, size
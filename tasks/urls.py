@@ -3,17 +3,22 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedSimpleRouter
 from rest_framework_simplejwt.views import TokenRefreshView
 from . import views
+from .realtime import task_events
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
 router.register(r'tasks', views.TaskViewSet)
 router.register(r'documents', views.TaskDocumentViewSet)
+router.register(r'uploads', views.UploadSessionViewSet)
 
 # Nested router: tasks -> documents
 tasks_router = NestedSimpleRouter(router, r'tasks', lookup='task')
 tasks_router.register(r'documents', views.TaskDocumentViewSet, basename='task-documents')
 
 urlpatterns = [
+    # Real-time task events (must come before the router, otherwise matched as a task id)
+    path('tasks/events/', task_events, name='task_events'),
+
     # API endpoints
     path('', include(router.urls)),
     path('', include(tasks_router.urls)),
@@ -21,8 +26,11 @@ urlpatterns = [
     path('token/', views.EmailTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('invitations/create/', views.create_invitation, name='create_invitation'),
+    path('invitations/bulk-create/', views.bulk_create_invitations, name='bulk_create_invitations'),
     path('invitations/list/', views.list_invitations, name='list_invitations'),
     path('invitations/cancel/<int:invitation_id>/', views.cancel_invitation, name='cancel_invitation'),
+    path('locations/check-in/', views.location_checkin, name='location_checkin'),
+    path('locations/latest/', views.latest_locations, name='latest_locations'),
     path('password-reset/', views.password_reset_request, name='password_reset_request'),
     path('password-reset/<str:uidb64>/<str:token>/', views.password_reset_confirm, name='password_reset_confirm'),
     
@@ -1,37 +1,148 @@
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .models import User, Task, TaskDocument, InvitationCode
+from .models import User, Task, TaskDocument, InvitationCode, UploadSession, WorkerLocation
 from .serializers import (
     UserSerializer, 
     TaskSerializer, 
     TaskDocumentSerializer,
-    EmailTokenObtainPairSerializer
+    EmailTokenObtainPairSerializer,
+    DirectUploadRequestSerializer,
+    DirectUploadConfirmSerializer,
+    UploadSessionSerializer,
+    BulkInvitationSerializer,
+    LocationCheckinSerializer
 )
-from .services import send_invitation_email
+from .services import send_invitation_email, send_invitation_emails
+from .storage import (
+    supports_direct_upload,
+    direct_upload_key,
+    is_direct_upload_key,
+    generate_presigned_upload,
+    uploaded_keys,
+    start_chunked_upload,
+    write_chunk,
+    finish_chunked_upload,
+    abort_chunked_upload
+)
+from .documents import (
+    save_task_documents,
+    batched_document_deletion,
+    schedule_storage_deletion,
+    DOCUMENT_COUNT_FIELDS
+)
+from .archives import stream_archive, astream_archive
+from .uploads import spool_request_body
+from .downloads import download_response
+from .geo import bounding_box_filter, haversine_expression, haversine_km
+from .routing import plan_route, route_cache_key
+from .recommendations import suggest_workers
+from .locations import record_checkins, PartitionMissing
 from django.utils import timezone
+from django.db import transaction, IntegrityError
+from django.db.models import BooleanField, ExpressionWrapper, Q
+import datetime
+import logging
+import os
 import random
 import string
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from django_filters import rest_framework as filters
 from rest_framework import filters as drf_filters
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.dateparse import parse_datetime
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.utils.html import strip_tags
 from notifications.models import DeviceToken
 from notifications.fcm import send_multicast_notification
 
+logger = logging.getLogger(__name__)
+
 # Create your views here.
 
+USER_SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+USER_SEARCH_MAX_LIMIT = 50
+
+def search_users(query, role=None, limit=20):
+    """
+    Searches active users by name, email and phone, every word must match.
+    Words of three or more characters use the trigram indexes (PostgreSQL,
+    migration 0012), shorter ones are prefix matches served by the
+    text_pattern_ops indexes (migration 0017). Returns minimal dicts.
+    """
+    users = User.objects.filter(is_active=True)
+    if role:
+        users = users.filter(role=role)
+
+    for term in query.split()[:5]:
+        lookup = 'icontains' if len(term) >= 3 else 'istartswith'
+        condition = Q()
+        for field in USER_SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__{lookup}': term})
+        users = users.filter(condition)
+
+    return users.order_by('first_name', 'last_name', 'id').values(
+        'id', 'first_name', 'last_name', 'email', 'role'
+    )[:max(limit, 1)]
+
+NEARBY_DEFAULT_RADIUS_KM = 10
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_MAX_RESULTS = 100
+SUGGESTED_WORKERS_MAX_LIMIT = 50
+
+def nearby_tasks(queryset, lat, lng, radius_km):
+    """
+    Open tasks of queryset within radius_km, annotated with distance_km and
+    ordered by it. The bounding box uses task_location_idx, the exact distance
+    is only computed for the tasks inside it.
+    """
+    return (
+        queryset.exclude(status='completed')
+        .filter(bounding_box_filter(lat, lng, radius_km))
+        .annotate(distance_km=haversine_expression(lat, lng))
+        .filter(distance_km__lte=radius_km)
+        .order_by('distance_km', 'id')
+    )
+
+def plan_worker_route(worker, day, origin=None):
+    """
+    Visiting order of the worker's open tasks whose start-due window includes day.
+    Tasks without coordinates are appended at the end. Returns a cacheable dict.
+    """
+    day_start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    tasks = list(
+        Task.objects.filter(assigned_workers=worker, start_date__lt=day_start + datetime.timedelta(days=1),
+                            due_date__gte=day_start)
+        .exclude(status='completed')
+        .order_by('start_date', 'id')
+        .values_list('id', 'latitude', 'longitude')
+    )
+    located = [task for task in tasks if task[1] is not None and task[2] is not None]
+    unlocated = [task[0] for task in tasks if task[1] is None or task[2] is None]
+
+    order, legs = plan_route([(float(lat), float(lng)) for _, lat, lng in located], origin)
+    if not origin and legs:
+        # The first stop has no leg without a starting position
+        legs[0] = None
+    return {
+        'task_ids': [located[index][0] for index in order] + unlocated,
+        'legs': legs + [None] * len(unlocated),
+        'total_distance_km': sum(leg for leg in legs if leg is not None)
+    }
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -115,6 +226,25 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        """
+        Autocomplete for task assignment, only site managers can search.
+        URL: /api/users/search/?q=&role=worker&limit=20
+        """
+        if request.user.role != 'site_manager':
+            return Response({
+                'error': 'Only site managers can perform this operation'
+            }, status=403)
+
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), USER_SEARCH_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=400)
+
+        users = search_users(request.query_params.get('q', ''), request.query_params.get('role'), limit)
+        return Response(list(users))
+
 class TaskPagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = 'page_size'
@@ -145,8 +275,13 @@ class TaskViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role == 'site_manager':
-            return Task.objects.all()
-        return Task.objects.filter(assigned_workers=user)
+            queryset = Task.objects.all()
+        else:
+            queryset = Task.objects.filter(assigned_workers=user)
+        if self.action in ('update', 'partial_update', 'complete'):
+            # Document counters are only written with F() updates, save() leaves deferred fields out
+            queryset = queryset.defer(*DOCUMENT_COUNT_FIELDS.values())
+        return queryset
 
     def update(self, request, *args, **kwargs):
         try:
@@ -164,32 +299,19 @@ class TaskViewSet(viewsets.ModelViewSet):
             serializer.is_valid(raise_exception=True)
             self.perform_update(serializer)
 
-            # Process new documents
-            starting_documents = []
-            if 'starting_documents' in request.FILES:
-                starting_documents = request.FILES.getlist('starting_documents', [])
-                
-                # Save each file in a separate transaction
-                for document in starting_documents:
-                    try:
-                        TaskDocument.objects.create(
-                            task=instance,
-                            document_type='beginning',
-                            file=document,
-                            uploaded_by=request.user
-                        )
-                    except Exception as doc_error:
-                        # If error occurs while saving file, log and continue
-                        print(f"Error saving update file: {str(doc_error)}")
+            # Process new documents (failed files are reported, not fatal)
+            starting_documents = request.FILES.getlist('starting_documents', [])
+            _, document_errors = save_task_documents(instance, 'beginning', starting_documents, request.user)
+            instance.refresh_from_db(fields=DOCUMENT_COUNT_FIELDS.values())
             
             # Get current task data
             serializer = self.get_serializer(instance)
-            return Response(serializer.data)
+            data = serializer.data
+            data['document_errors'] = document_errors
+            return Response(data)
             
         except Exception as e:
-            import traceback
-            print(f"Task update error: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception(f"Task update error: {e}")
             return Response(
                 {'error': f'An error occurred while updating task: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -198,45 +320,145 @@ class TaskViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         try:
             # Get task data
-            task_data = request.data.copy()
+            # Not copied: a deep copy would duplicate uploaded files (and cannot copy the ones spooled to disk)
+            task_data = request.data
             
             # Separate files from task_data (to prevent serialization issues)
-            starting_documents = []
-            if 'starting_documents' in request.FILES:
-                starting_documents = request.FILES.getlist('starting_documents', [])
+            starting_documents = request.FILES.getlist('starting_documents', [])
             
             # Create task
             serializer = self.get_serializer(data=task_data)
             serializer.is_valid(raise_exception=True)
             task = serializer.save(created_by=self.request.user)
             
-            # Save documents in separate transactions
-            for document in starting_documents:
-                try:
-                    # Save each file in a separate transaction
-                    TaskDocument.objects.create(
-                        task=task,
-                        document_type='beginning',
-                        file=document,
-                        uploaded_by=self.request.user
-                    )
-                except Exception as doc_error:
-                    # If error occurs while saving file, log and continue
-                    print(f"Error saving file: {str(doc_error)}")
+            # Save documents (failed files are reported, not fatal)
+            _, document_errors = save_task_documents(task, 'beginning', starting_documents, self.request.user)
+            task.refresh_from_db(fields=DOCUMENT_COUNT_FIELDS.values())
             
             # Get current task data
             serializer = self.get_serializer(task)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            data = serializer.data
+            data['document_errors'] = document_errors
+            return Response(data, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            import traceback
-            print(f"Task creation error: {str(e)}")
-            print(traceback.format_exc())  # For detailed error information
+            logger.exception(f"Task creation error: {e}")
             return Response(
                 {'error': f'Error creating task: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    def perform_destroy(self, instance):
+        # Cascaded documents release their files together, storage objects are removed in batches
+        with batched_document_deletion():
+            instance.delete()
+
+    @action(detail=False, methods=['GET'])
+    def nearby(self, request):
+        """
+        Open tasks within radius km of a point, nearest first.
+        URL: /api/tasks/nearby/?lat=41.01&lng=28.97&radius=5&limit=50
+        """
+        try:
+            lat = float(request.query_params['lat'])
+            lng = float(request.query_params['lng'])
+            radius = float(request.query_params.get('radius', NEARBY_DEFAULT_RADIUS_KM))
+            limit = int(request.query_params.get('limit', NEARBY_MAX_RESULTS))
+        except KeyError:
+            return Response({'error': 'lat and lng are required'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'error': 'lat, lng, radius and limit must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({'error': 'Invalid coordinates'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+            return Response(
+                {'error': f'radius must be between 0 and {NEARBY_MAX_RADIUS_KM} km'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        tasks = nearby_tasks(self.get_queryset(), lat, lng, radius)
+        tasks = tasks.prefetch_related('assigned_workers')[:max(1, min(limit, NEARBY_MAX_RESULTS))]
+
+        results = []
+        for task in tasks:
+            data = self.get_serializer(task).data
+            data['distance_km'] = round(task.distance_km, 3)
+            results.append(data)
+        return Response(results)
+
+    @action(detail=False, methods=['GET'])
+    def route(self, request):
+        """
+        Open tasks of a worker for a day in visiting order.
+        URL: /api/tasks/route/?date=2025-01-31&worker=5&lat=41.01&lng=28.97
+        Workers get their own route, site managers pass the worker.
+        lat/lng (optional) is the starting position.
+        """
+        params = request.query_params
+        try:
+            day = datetime.date.fromisoformat(params['date']) if params.get('date') else timezone.localdate()
+            origin = (float(params['lat']), float(params['lng'])) if params.get('lat') and params.get('lng') else None
+        except ValueError:
+            return Response({'error': 'Invalid date or coordinates'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.user.role == 'site_manager':
+            if not params.get('worker'):
+                return Response({'error': 'worker is required'}, status=status.HTTP_400_BAD_REQUEST)
+            worker = get_object_or_404(User, pk=params['worker'], role='worker')
+        else:
+            worker = request.user
+
+        key = route_cache_key(worker.pk, day, origin)
+        planned = cache.get(key)
+        if planned is None:
+            planned = plan_worker_route(worker, day, origin)
+            cache.set(key, planned, settings.ROUTE_CACHE_TIMEOUT)
+
+        tasks = Task.objects.prefetch_related('assigned_workers').in_bulk(planned['task_ids'])
+        legs = list(planned['legs'])
+        total_distance = planned['total_distance_km']
+        first = tasks.get(planned['task_ids'][0]) if planned['task_ids'] else None
+        if origin and legs and legs[0] is not None and first is not None:
+            # The cache key rounds the origin, the first leg is measured from the exact position
+            exact = haversine_km(origin[0], origin[1], first.latitude, first.longitude)
+            total_distance += exact - legs[0]
+            legs[0] = exact
+
+        results = []
+        for task_id, leg in zip(planned['task_ids'], legs):
+            if task_id not in tasks:
+                continue
+            data = self.get_serializer(tasks[task_id]).data
+            data['distance_from_previous_km'] = None if leg is None else round(leg, 3)
+            results.append(data)
+
+        return Response({
+            'date': day,
+            'worker': worker.pk,
+            'total_distance_km': round(total_distance, 3),
+            'tasks': results
+        })
+
+    @action(detail=True, methods=['GET'], url_path='suggested-workers')
+    def suggested_workers(self, request, pk=None):
+        """
+        Workers ranked by workload, schedule overlap and distance for the task.
+        URL: /api/tasks/{id}/suggested-workers/?limit=10
+        """
+        if request.user.role != 'site_manager':
+            return Response({
+                'error': 'Only site managers can perform this operation'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), SUGGESTED_WORKERS_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        task = self.get_object()
+        return Response(suggest_workers(task, max(limit, 1)))
+
     @action(detail=True, methods=['POST'])
     def complete(self, request, pk=None):
         try:
@@ -249,23 +471,9 @@ class TaskViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            # Separate and process documents
-            completion_documents = []
-            if 'completion_documents' in request.FILES:
-                completion_documents = request.FILES.getlist('completion_documents', [])
-            
-            # Save each file in a separate transaction
-            for document in completion_documents:
-                try:
-                    TaskDocument.objects.create(
-                        task=task,
-                        document_type='ending',
-                        file=document,
-                        uploaded_by=request.user
-                    )
-                except Exception as doc_error:
-                    # If error occurs while saving file, log and continue
-                    print(f"Error saving completion file: {str(doc_error)}")
+            # Save completion documents (failed files are reported, not fatal)
+            completion_documents = request.FILES.getlist('completion_documents', [])
+            _, document_errors = save_task_documents(task, 'ending', completion_documents, request.user)
 
             # Mark task as completed
             task.status = 'completed'
@@ -296,17 +504,120 @@ class TaskViewSet(viewsets.ModelViewSet):
                         data=notification_data
                     )
 
-            return Response({"detail": "Task completed successfully."})
+            return Response({
+                "detail": "Task completed successfully.",
+                "document_errors": document_errors
+            })
             
         except Exception as e:
-            import traceback
-            print(f"Task completion error: {str(e)}")
-            print(traceback.format_exc())
+            logger.exception(f"Task completion error: {e}")
             return Response(
                 {"error": f"An error occurred while completing task: {str(e)}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=True, methods=['GET'], url_path='documents/archive')
+    def documents_archive(self, request, pk=None):
+        """
+        Streams a ZIP archive of all starting and ending documents of the task.
+        URL: /api/tasks/{id}/documents/archive/
+        """
+        task = self.get_object()
+        documents = task.documents.order_by('document_type', 'uploaded_at', 'id')
+
+        # The ASGI server needs an async iterator, it would collect a sync one in memory
+        stream = astream_archive if isinstance(request._request, ASGIRequest) else stream_archive
+        response = StreamingHttpResponse(stream(documents.iterator()), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="task-{task.id}-documents.zip"'
+        # Let nginx pass the stream through instead of buffering it
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=True, methods=['POST'], url_path='documents/presign')
+    def presign_documents(self, request, pk=None):
+        """
+        Step 1 of direct uploads: returns presigned URLs so files are uploaded
+        straight to object storage without passing through Django.
+        URL: /api/tasks/{id}/documents/presign/
+        """
+        task = self.get_object()
+
+        if not supports_direct_upload():
+            return Response(
+                {'error': 'Direct uploads are not supported by the configured storage.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = DirectUploadRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        uploads = [
+            generate_presigned_upload(
+                direct_upload_key(task.id, file['name']),
+                file['content_type']
+            )
+            for file in serializer.validated_data['files']
+        ]
+
+        return Response({
+            'document_type': serializer.validated_data['document_type'],
+            'uploads': uploads
+        })
+
+    @action(detail=True, methods=['POST'], url_path='documents/confirm')
+    def confirm_documents(self, request, pk=None):
+        """
+        Step 2 of direct uploads: creates document records for uploaded objects.
+        URL: /api/tasks/{id}/documents/confirm/
+        """
+        task = self.get_object()
+
+        if not supports_direct_upload():
+            return Response(
+                {'error': 'Direct uploads are not supported by the configured storage.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = DirectUploadConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        document_type = serializer.validated_data['document_type']
+        keys = list(dict.fromkeys(serializer.validated_data['keys']))
+
+        # Only keys generated for this task can be confirmed
+        invalid_keys = [key for key in keys if not is_direct_upload_key(task.id, key)]
+        if invalid_keys:
+            return Response(
+                {'keys': [f'Invalid upload key: {key}' for key in invalid_keys]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Confirming the same key twice must not create duplicate documents
+        # (keys confirmed before uploads were copied into blobs are document files themselves)
+        confirmed_keys = set(TaskDocument.objects.filter(file__in=keys).values_list('file', flat=True))
+        keys = [key for key in keys if key not in confirmed_keys]
+
+        existing = uploaded_keys(task.id, keys)
+        missing_keys = [key for key in keys if key not in existing]
+
+        # Uploaded objects go through the same path as multipart uploads: content addressed
+        # blobs with their metadata, counters and background processing
+        files = [default_storage.open(key, 'rb') for key in keys if key in existing]
+        try:
+            documents, document_errors = save_task_documents(task, document_type, files, request.user)
+        finally:
+            for file in files:
+                file.close()
+
+        # The content is stored under its blob key now, the uploaded objects are not needed anymore
+        failed = {error['file'] for error in document_errors}
+        schedule_storage_deletion([file.name for file in files if file.name not in failed])
+
+        return Response({
+            'documents': TaskDocumentSerializer(documents, many=True, context=self.get_serializer_context()).data,
+            'missing_keys': missing_keys,
+            'document_errors': document_errors
+        }, status=status.HTTP_201_CREATED)
+
 class DocumentPagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = 'page_size'
@@ -316,10 +627,12 @@ class TaskDocumentFilter(filters.FilterSet):
     document_type = filters.CharFilter(lookup_expr='exact')
     uploaded_at = filters.DateTimeFromToRangeFilter()
     task = filters.NumberFilter(field_name='task__id')
+    content_type = filters.CharFilter(lookup_expr='istartswith')  # e.g. ?content_type=image/
+    size = filters.RangeFilter()  # ?size_min=&size_max= in bytes
     
     class Meta:
         model = TaskDocument
-        fields = ['document_type', 'uploaded_at', 'task']
+        fields = ['document_type', 'uploaded_at', 'task', 'content_type', 'size']
 
 class TaskDocumentViewSet(viewsets.ModelViewSet):
     queryset = TaskDocument.objects.all()
@@ -328,7 +641,7 @@ class TaskDocumentViewSet(viewsets.ModelViewSet):
     pagination_class = DocumentPagination
     filter_backends = [filters.DjangoFilterBackend, drf_filters.OrderingFilter, drf_filters.SearchFilter]
     filterset_class = TaskDocumentFilter
-    ordering_fields = ['uploaded_at', 'document_type']
+    ordering_fields = ['uploaded_at', 'document_type', 'size']
     ordering = ['uploaded_at']
     search_fields = ['file']
 
@@ -354,19 +667,183 @@ class TaskDocumentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(uploaded_by=self.request.user)
 
+    @action(detail=True, methods=['GET'])
+    def download(self, request, *args, **kwargs):
+        """
+        Protected download, visibility is the same as for listing documents.
+        URL: /api/documents/{id}/download/?variant=file|thumbnail|original
+        """
+        document = self.get_object()
+
+        variant = request.query_params.get('variant', 'file')
+        files = {'file': document.file, 'thumbnail': document.thumbnail, 'original': document.original_file}
+        if variant not in files:
+            return Response(
+                {'error': 'variant must be one of: file, thumbnail, original.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        file = files[variant]
+        if not file:
+            return Response({'error': 'This document has no such file.'}, status=status.HTTP_404_NOT_FOUND)
+
+        filename = f"{document.get_document_type_display()} {document.id}{os.path.splitext(file.name)[1]}"
+        content_type = document.content_type if variant == 'file' else None
+        return download_response(file, filename, content_type)
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Resumable (tus-style) document uploads.
+
+    POST   /api/uploads/       - Start an upload (task, document_type, filename, content_type, length)
+    HEAD   /api/uploads/{id}/  - Resume query, current offset is returned in the Upload-Offset header
+    PATCH  /api/uploads/{id}/  - Append the raw request body at the Upload-Offset header
+    DELETE /api/uploads/{id}/  - Abort the upload
+    """
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(uploaded_by=self.request.user)
+
+    def _offset_headers(self, session):
+        return {
+            'Upload-Offset': str(session.offset),
+            'Upload-Length': str(session.length),
+            'Cache-Control': 'no-store',
+        }
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task = serializer.validated_data['task']
+
+        # Only site manager or assigned workers can upload documents
+        if request.user.role != 'site_manager' and not task.assigned_workers.filter(id=request.user.id).exists():
+            return Response(
+                {"detail": "You do not have permission to upload documents to this task."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        key = direct_upload_key(task.id, serializer.validated_data['filename'])
+        upload_id = start_chunked_upload(key, serializer.validated_data.get('content_type'))
+        session = serializer.save(uploaded_by=request.user, key=key, storage_upload_id=upload_id)
+
+        headers = self._offset_headers(session)
+        headers['Location'] = request.build_absolute_uri(f'{session.id}/')
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def retrieve(self, request, *args, **kwargs):
+        session = self.get_object()
+        serializer = self.get_serializer(session)
+        return Response(serializer.data, headers=self._offset_headers(session))
+
+    def partial_update(self, request, *args, **kwargs):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response(
+                {'error': 'Upload-Offset header is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # The chunk is streamed to a spooled file, not buffered in request.body
+        chunk, size = spool_request_body(request, settings.RESUMABLE_UPLOAD_MAX_CHUNK_SIZE)
+        if chunk is None:
+            return Response(
+                {'error': f'Chunks can be at most {settings.RESUMABLE_UPLOAD_MAX_CHUNK_SIZE} bytes.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with chunk:
+            if not size:
+                return Response({'error': 'Chunk is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+            return self._append_chunk(request, offset, chunk, size, kwargs['pk'])
+
+    def _append_chunk(self, request, offset, chunk, size, pk):
+        # Lock the session so two nodes cannot write the same offset
+        with transaction.atomic():
+            session = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+
+            if session.document_id:
+                return Response(
+                    {'error': 'This upload is already completed.'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers=self._offset_headers(session)
+                )
+
+            if offset != session.offset:
+                return Response(
+                    {'error': f'Upload-Offset does not match, expected {session.offset}.'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers=self._offset_headers(session)
+                )
+
+            end = session.offset + size
+            if end > session.length:
+                return Response(
+                    {'error': 'Chunk exceeds the upload length.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Storage multipart uploads need a minimum part size except for the last part
+            if end < session.length and size < settings.RESUMABLE_UPLOAD_MIN_CHUNK_SIZE:
+                return Response(
+                    {'error': f'Chunks must be at least {settings.RESUMABLE_UPLOAD_MIN_CHUNK_SIZE} bytes except the last one.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            write_chunk(session, chunk)
+            session.offset = end
+
+            if session.is_complete:
+                finish_chunked_upload(session)
+                session.document = TaskDocument.objects.create(
+                    task=session.task,
+                    document_type=session.document_type,
+                    file=session.key,
+                    uploaded_by=session.uploaded_by,
+                    size=session.length,
+                    content_type=session.content_type
+                )
+
+            session.save()
+
+        if session.document:
+            serializer = TaskDocumentSerializer(session.document, context=self.get_serializer_context())
+            return Response(serializer.data, status=status.HTTP_201_CREATED, headers=self._offset_headers(session))
+
+        return Response(status=status.HTTP_204_NO_CONTENT, headers=self._offset_headers(session))
+
+    def perform_destroy(self, instance):
+        if not instance.document_id:
+            abort_chunked_upload(instance)
+        instance.delete()
+
 class EmailTokenObtainPairView(TokenObtainPairView):
     serializer_class = EmailTokenObtainPairSerializer
 
+INVITATION_STATES = ('active', 'used', 'expired', 'cancelled')
+
+def generate_unique_codes(count, length=6):
+    """Generates unique invitation codes, existing codes are checked with one query per round"""
+    # Create code from mixed characters (excluding 0, O, 1, I)
+    chars = string.ascii_uppercase.replace('O', '').replace('I', '') + string.digits.replace('0', '').replace('1', '')
+
+    codes = set()
+    while len(codes) < count:
+        candidates = {''.join(random.choices(chars, k=length)) for _ in range(count - len(codes))} - codes
+        taken = set(InvitationCode.objects.filter(code__in=candidates).values_list('code', flat=True))
+        codes |= candidates - taken
+    return list(codes)
+
 def generate_unique_code(length=6):
     """Generates a unique invitation code"""
-    while True:
-        # Create code from mixed characters (excluding 0, O, 1, I)
-        chars = string.ascii_uppercase.replace('O', '').replace('I', '') + string.digits.replace('0', '').replace('1', '')
-        code = ''.join(random.choices(chars, k=length))
-        
-        # Check if code is unique
-        if not InvitationCode.objects.filter(code=code).exists():
-            return code
+    return generate_unique_codes(1, length)[0]
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -411,7 +888,7 @@ def create_invitation(request):
         expires_at=timezone.now() + timezone.timedelta(hours=24)
     )
     
-    # Send email
+    # Queue email (delivered by the send_queued_mail worker)
     try:
         send_invitation_email(email, code)
         return Response({
@@ -424,30 +901,132 @@ def create_invitation(request):
             'error': f'Email could not be sent: {str(e)}'
         }, status=500)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_invitations(request):
+    """
+    Creates invitations for many emails at once.
+    Registered emails and emails with an active invitation are skipped.
+    """
+    if request.user.role != 'site_manager':
+        return Response({
+            'error': 'Only site managers can perform this operation'
+        }, status=403)
+
+    serializer = BulkInvitationSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    emails = list(dict.fromkeys(email.strip() for email in serializer.validated_data['emails']))
+
+    # One IN query each for registered users and active invitations
+    registered = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    invited = set(InvitationCode.objects.filter(
+        email__in=emails,
+        is_used=False,
+        is_cancelled=False,
+        expires_at__gt=timezone.now()
+    ).values_list('email', flat=True))
+
+    skipped = []
+    new_emails = []
+    for email in emails:
+        if email in registered:
+            skipped.append({'email': email, 'error': 'This email address already belongs to a registered user'})
+        elif email in invited:
+            skipped.append({'email': email, 'error': 'An active invitation code already exists for this email'})
+        else:
+            new_emails.append(email)
+
+    invitations = []
+    if new_emails:
+        expires_at = timezone.now() + timezone.timedelta(hours=24)
+        for attempt in range(3):
+            invitations = [
+                InvitationCode(code=code, email=email, created_by=request.user, expires_at=expires_at)
+                for email, code in zip(new_emails, generate_unique_codes(len(new_emails)))
+            ]
+            try:
+                with transaction.atomic():
+                    InvitationCode.objects.bulk_create(invitations)
+                    # Queued together with the invitations
+                    send_invitation_emails(invitations)
+                break
+            except IntegrityError:
+                # A code was taken by a concurrent request meanwhile, generate new ones
+                if attempt == 2:
+                    raise
+            except Exception as e:
+                return Response({
+                    'error': f'Emails could not be sent: {str(e)}'
+                }, status=500)
+
+    return Response({
+        'created': [invitation.email for invitation in invitations],
+        'skipped': skipped
+    }, status=201 if invitations else 200)
+
+class InvitationPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+def filter_invitations_by_state(queryset, state, now):
+    """Filters invitations in the database by state: active, used, expired or cancelled"""
+    if state == 'active':
+        return queryset.filter(is_used=False, is_cancelled=False, expires_at__gt=now)
+    if state == 'used':
+        return queryset.filter(is_used=True)
+    if state == 'expired':
+        return queryset.filter(is_used=False, is_cancelled=False, expires_at__lte=now)
+    if state == 'cancelled':
+        return queryset.filter(is_cancelled=True)
+    return queryset
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_invitations(request):
+    """
+    Lists invitation codes, newest first, with cursor pagination.
+    URL: /api/invitations/list/?state=active|used|expired|cancelled&cursor=
+    """
     if request.user.role != 'site_manager':
         return Response({
             'error': 'Only site managers can perform this operation'
         }, status=403)
-    
-    # Get all invitation codes (removed created_by filter)
-    invitations = InvitationCode.objects.all().order_by('-created_at')
-    
+
+    state = request.query_params.get('state')
+    if state and state not in INVITATION_STATES:
+        return Response({
+            'error': f"state must be one of: {', '.join(INVITATION_STATES)}"
+        }, status=400)
+
+    now = timezone.now()
+    # Creator is joined and expiry is computed in the same query
+    invitations = filter_invitations_by_state(InvitationCode.objects.all(), state, now).select_related(
+        'created_by'
+    ).only(
+        'id', 'email', 'created_at', 'expires_at', 'is_used', 'is_cancelled', 'used_at',
+        'created_by__first_name', 'created_by__last_name', 'created_by__email'
+    ).annotate(
+        is_expired=ExpressionWrapper(Q(expires_at__lt=now), output_field=BooleanField())
+    )
+
+    paginator = InvitationPagination()
+    page = paginator.paginate_queryset(invitations, request)
+
     data = [{
         'id': inv.id,
         'email': inv.email,
         'created_at': inv.created_at,
         'expires_at': inv.expires_at,
         'is_used': inv.is_used,
-        'is_expired': inv.expires_at < timezone.now(),
+        'is_expired': inv.is_expired,
         'is_cancelled': inv.is_cancelled,
         'used_at': inv.used_at,
         'created_by': f"{inv.created_by.first_name} {inv.created_by.last_name}".strip() or inv.created_by.email
-    } for inv in invitations]
-    
-    return Response(data)
+    } for inv in page]
+
+    return paginator.get_paginated_response(data)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -475,6 +1054,56 @@ def cancel_invitation(request, invitation_id):
         'message': 'Invitation code successfully cancelled'
     })
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def location_checkin(request):
+    """
+    Stores a batch of GPS points of the current user.
+    Body: {"points": [{"latitude": 41.01, "longitude": 28.97, "recorded_at": "...", "accuracy": 8}, ...]}
+    """
+    serializer = LocationCheckinSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    try:
+        accepted, rejected = record_checkins(request.user, serializer.validated_data['points'])
+    except PartitionMissing:
+        # Phones keep the batch and send it again
+        return Response({'error': 'Locations cannot be stored right now, try again later'}, status=503)
+    return Response({'accepted': accepted, 'rejected': rejected}, status=201 if accepted else 200)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def latest_locations(request):
+    """
+    Latest position of every worker for the manager map.
+    URL: /api/locations/latest/?since=2025-01-31T08:00:00Z
+    """
+    if request.user.role != 'site_manager':
+        return Response({
+            'error': 'Only site managers can perform this operation'
+        }, status=403)
+
+    locations = WorkerLocation.objects.select_related('worker').only(
+        'latitude', 'longitude', 'accuracy', 'recorded_at',
+        'worker__first_name', 'worker__last_name', 'worker__email'
+    ).order_by('worker_id')
+
+    since = request.query_params.get('since')
+    if since:
+        since = parse_datetime(since)
+        if since is None:
+            return Response({'error': 'since must be an ISO 8601 date and time'}, status=400)
+        locations = locations.filter(recorded_at__gte=since)
+
+    return Response([{
+        'worker': location.worker_id,
+        'full_name': f"{location.worker.first_name} {location.worker.last_name}".strip() or location.worker.email,
+        'latitude': location.latitude,
+        'longitude': location.longitude,
+        'accuracy': location.accuracy,
+        'recorded_at': location.recorded_at
+    } for location in locations])
+
 @api_view(['POST'])
 def password_reset_request(request):
     email = request.data.get('email')
@@ -567,6 +1196,8 @@ def password_reset_confirm(request, uidb64, token):
             
             # Update password
             user.set_password(new_password)
+            # Tokens issued with the old password stop working
+            user.revoke_tokens()
             user.save()
             
             return render(request, 'password_reset_form.html', {